@@ -0,0 +1,269 @@
+import sys
+import json
+import time
+import typing
+import random
+import platform
+import argparse
+import tempfile
+import importlib.util
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, dirname(abspath(__file__)))
+
+import main
+from main import LogWaiterPromise, MinecraftServer
+
+# 控制器基准测试: 以 fake_server.py 代替 Java 服务器, 结果以 JSON 输出, 便于不同版本之间对比
+#
+# python benchmark.py [--quick] [--output result.json] [--compare baseline.json]
+
+SRC_DIR = dirname(abspath(__file__))
+
+class FakeMinecraftServer(MinecraftServer):
+    # 默认丢弃服务器日志, 标准输出只留给 JSON 结果
+    def __init__(self, loghooker: typing.Callable[[str], typing.Any] = lambda x: ""):
+        super().__init__(
+            server_path = join(SRC_DIR, "fake_server.py"),
+            server_rundir = tempfile.mkdtemp(prefix="mscr-bench-"),
+            loghooker = loghooker
+        )
+
+    def launch_command(self, args: typing.Iterable[str], max_mem: str):
+        return [sys.executable, "-u", self.server_path, *args]
+
+    def boot(self, *fake_args: str):
+        done = LogWaiterPromise(self, lambda line: "]: Done (" in line)
+        rcon = LogWaiterPromise(self, lambda line: "RCON running on " in line) if "--rcon-port" in fake_args else None
+        self.start(args=fake_args)
+        done.wait()
+
+        if rcon is not None:
+            port = int(rcon.wait().rsplit(":", 1)[1])
+            self.connect_rcon("127.0.0.1", port, "test")
+        return self
+
+    def shutdown(self):
+        # 先断开 RCON, 避免接收线程在服务器退出后尝试重连
+        self.disconnect_rcon()
+        self.stop()
+
+def result(name: str, ops: int, seconds: float, **extra: typing.Any):
+    return {
+        "name": name,
+        "ops": ops,
+        "seconds": seconds,
+        "ops_per_sec": ops / seconds if seconds > 0 else 0.0,
+        **extra
+    }
+
+def _sync(server: MinecraftServer):
+    # 发送一个标记并等待服务器处理到它, 之前发送的命令也已全部处理
+    marker = f"bench-{random.getrandbits(32)}"
+    pm = LogWaiterPromise(server, lambda line: f"[Server] {marker}" in line)
+    server.run_command(f"say {marker}")
+    pm.wait()
+
+def bench_run_command(server: MinecraftServer, n: int):
+    start = time.perf_counter()
+    for i in range(n):
+        server.run_command(f"setblock {i} 64 0 minecraft:stone")
+    _sync(server)
+    return result("stdin_run_command", n, time.perf_counter() - start)
+
+def bench_run_commands(server: MinecraftServer, n: int, batch: int = 1000):
+    commands = [f"setblock {i} 64 0 minecraft:stone" for i in range(n)]
+    start = time.perf_counter()
+    for i in range(0, n, batch):
+        server.run_commands(commands[i:i + batch])
+    _sync(server)
+    return result("stdin_run_commands", n, time.perf_counter() - start, batch=batch)
+
+def bench_rcon(server: MinecraftServer, n: int, name: str = "rcon_roundtrip"):
+    start = time.perf_counter()
+    for _ in range(n):
+        server.run_command("list", urcon=True).wait()
+    return result(name, n, time.perf_counter() - start)
+
+def bench_rcon_pipelined(server: MinecraftServer, n: int):
+    start = time.perf_counter()
+    promises = [server.run_command("list", urcon=True) for _ in range(n)]
+    for pm in promises: pm.wait()
+    return result("rcon_pipelined", n, time.perf_counter() - start)
+
+def bench_byfunc(server: MinecraftServer, jobs: int, lines: int):
+    body = "\n".join(f"setblock {i} 64 0 minecraft:stone" for i in range(lines))
+    start = time.perf_counter()
+    for _ in range(jobs):
+        server.run_command_byfunc(body).wait()
+    return result("run_command_byfunc", jobs, time.perf_counter() - start, lines_per_job=lines)
+
+def bench_log_dispatch(server: MinecraftServer, lines: int, plugin_counts: tuple[int, ...]):
+    # 使用控制器真实的分发路径 (LogDispatcher -> PluginCommand / LazyPluginCommand), 一半命令为未加载插件的占位命令
+    results = []
+    for count in plugin_counts:
+        dispatcher = main.LogDispatcher(server)
+        dispatcher.plugin_commands.extend(
+            main.PluginCommand(f"bench{i}", callback=lambda *args: None) if i % 2 == 0 else main.LazyPluginCommand(None, f"bench{i}")
+            for i in range(count)
+        )
+
+        server.loghooker = dispatcher.loghooker
+        pm = LogWaiterPromise(server, lambda line: f"fake-burst-done {lines}" in line)
+        start = time.perf_counter()
+        server.run_command(f"fake-burst {lines}")
+        pm.wait()
+        results.append(result(f"log_dispatch_{count}_plugins", lines, time.perf_counter() - start, plugins=count))
+
+    server.loghooker = lambda x: ""
+    return results
+
+def _load_plugin(name: str):
+    path = join(SRC_DIR, "builtin-plugins", f"{name}.py")
+    spec = importlib.util.spec_from_file_location(f"bench_{name.replace("-", "_")}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _colordata(blocks: int = 200):
+    rng = random.Random(0)
+    return {f"minecraft:block_{i}": [rng.randrange(256), rng.randrange(256), rng.randrange(256)] for i in range(blocks)}
+
+def bench_drawim(size: int):
+    import numpy as np
+    from PIL import Image
+
+    path = join(tempfile.mkdtemp(prefix="mscr-bench-"), "image.png")
+    Image.fromarray(np.random.default_rng(0).integers(0, 256, (size, size, 3), dtype=np.uint8)).save(path)
+
+    # 只把命令加入等待队列, 不需要启动服务器
+    server = FakeMinecraftServer()
+    getBlock_ByColor = main.color_matcher(_colordata())
+    cache = main.AssetCache()
+
+    start = time.perf_counter()
+    blocks = main.draw_image(server, cache, getBlock_ByColor, path, (0, 64, 0), (1, 1), (size, size))
+    cold = time.perf_counter() - start
+    server.waiting_commands.clear()
+
+    start = time.perf_counter()
+    main.draw_image(server, cache, getBlock_ByColor, path, (0, 64, 0), (1, 1), (size, size))
+    warm = time.perf_counter() - start
+    server.waiting_commands.clear()
+    return result("drawim_prepare", blocks, cold, cached_seconds=warm)
+
+def bench_console_show(frames: int):
+    import numpy as np
+
+    plugin = _load_plugin("console-show")
+    rng = np.random.default_rng(0)
+    video = [rng.integers(0, 4, (360, 640, 3), dtype=np.uint8) * 80 for _ in range(8)]
+    fmt = plugin.FrameFormat((64, 36), 16).prepare(video)
+
+    start = time.perf_counter()
+    size = sum(len(fmt.encode(video[i % len(video)])) for i in range(frames))
+    return result("console_show_encode", frames, time.perf_counter() - start, avg_bytes=size / frames)
+
+def bench_mc3d(subdivisions: int, resolution: float):
+    import numpy as np
+
+    plugin = _load_plugin("mc3d")
+    plugin.gvars = {"getBlock_ByColor": main.color_matcher(_colordata())}
+    trimesh = plugin.trimesh
+
+    # 带球面纹理坐标的球体, 覆盖体素化, 按纹理选方块和外壳提取三段
+    mesh = trimesh.creation.icosphere(subdivisions=subdivisions)
+    v = mesh.vertices
+    mesh.visual = trimesh.visual.TextureVisuals(uv=np.stack([np.arctan2(v[:, 1], v[:, 0]) / (2 * np.pi) + 0.5, np.arccos(np.clip(v[:, 2], -1, 1)) / np.pi], axis=1))
+    texture = np.random.default_rng(0).integers(0, 256, (256, 256, 3), dtype=np.uint8)
+
+    start = time.perf_counter()
+    matrix, _, _, uv = plugin.voxelize_mesh(mesh, 1.0, resolution)
+    voxelize = time.perf_counter() - start
+    count = int(matrix.sum())
+
+    start = time.perf_counter()
+    palette, _ = plugin.assign_blocks(uv, texture, count)
+    assign = time.perf_counter() - start
+
+    start = time.perf_counter()
+    shell = plugin.exterior_shell(matrix)
+    shell_seconds = time.perf_counter() - start
+
+    return [
+        result("mc3d_voxelize", count, voxelize, resolution=resolution),
+        result("mc3d_assign_blocks", count, assign, palette=len(palette)),
+        result("mc3d_exterior_shell", count, shell_seconds, shell_voxels=int(shell.sum()))
+    ]
+
+def _optional(name: str, func: typing.Callable[[], dict|list[dict]]):
+    try:
+        results = func()
+    except ImportError as e:
+        return [{"name": name, "skipped": f"missing dependency: {e.name}"}]
+    return results if isinstance(results, list) else [results]
+
+def run(quick: bool = False):
+    scale = 0.1 if quick else 1.0
+    n = lambda x: max(1, int(x * scale))
+    results = []
+
+    server = FakeMinecraftServer().boot("--rcon-port", "0")
+    try:
+        results.append(bench_run_command(server, n(20000)))
+        results.append(bench_run_commands(server, n(20000)))
+        results.append(bench_rcon(server, n(2000)))
+        results.append(bench_rcon_pipelined(server, n(2000)))
+        results.append(bench_byfunc(server, n(20), 5000))
+        results.extend(bench_log_dispatch(server, n(20000), (0, 10, 50)))
+    finally:
+        server.shutdown()
+
+    server = FakeMinecraftServer().boot("--rcon-port", "0", "--fragment", "--latency-ms", "1")
+    try:
+        results.append(bench_rcon(server, n(200), "rcon_fragmented_latency"))
+    finally:
+        server.shutdown()
+
+    results.extend(_optional("drawim_prepare", lambda: bench_drawim(64)))
+    results.extend(_optional("console_show_encode", lambda: bench_console_show(n(500))))
+    results.extend(_optional("mc3d", lambda: bench_mc3d(4, 64.0)))
+
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick
+        },
+        "results": results
+    }
+
+def compare(current: dict, baseline: dict):
+    old = {r["name"]: r for r in baseline["results"] if "ops_per_sec" in r}
+    lines = [f"{"benchmark":<32} {"baseline/s":>12} {"current/s":>12} {"change":>8}"]
+    for r in current["results"]:
+        if "ops_per_sec" not in r or r["name"] not in old: continue
+        before = old[r["name"]]["ops_per_sec"]
+        lines.append(f"{r["name"]:<32} {before:>12.1f} {r["ops_per_sec"]:>12.1f} {r["ops_per_sec"] / before - 1:>+8.1%}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Minecraft Server Controler benchmarks.")
+    parser.add_argument("--quick", action="store_true", help="run with 10% of the default sizes")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON results to compare with")
+    args = parser.parse_args()
+
+    report = run(args.quick)
+    text = json.dumps(report, indent=4)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
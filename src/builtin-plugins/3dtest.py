@@ -1,12 +1,17 @@
 import math
+import re
 import typing
 import json
 import time
 import random
+import uuid
+import logging
 import numpy as np
 
 from tqdm import tqdm
 
+plugin_meta = {"lazy": True, "commands": ["3dtest", "3dtest-spin", "3dtest-clear"]}
+
 class Transform3D:
     def __init__(self, matrix: typing.Optional[typing.Tuple[float, ...]] = None):
         # 使用行主序存储4x4矩阵 (16个元素)
@@ -237,6 +242,8 @@ def init(f: typing.Callable[[], dict[str, typing.Any]]):
     
     gvars = f()
     gvars["plugin_commands"].append(gvars["PluginCommand"](startswith="3dtest", callback=main, need_async=True))
+    gvars["plugin_commands"].append(gvars["PluginCommand"](startswith="3dtest-spin", callback=spin, need_async=True))
+    gvars["plugin_commands"].append(gvars["PluginCommand"](startswith="3dtest-clear", callback=clear, need_async=True))
 
     return {
         "name": "3dtest",
@@ -383,48 +390,579 @@ def summon_triangle_with_lighting(server, p1, p2, p3, base_color=(0x39, 0xbb, 0x
     
     return [p1, p2, p3]
 
-def main(server, sender, tokens: list[str]):
-    if len(tokens) < 2:
-        _tellraw(server, sender, {"text": "usage: 3dtest <filepath> <x,y,z>", "color": "red"})
-        return
+def calculate_normals(tris: np.ndarray):
+    """批量计算三角形的法向量
+
+    参数:
+    tris - (F, 3, 3) 三角形顶点数组
+
+    返回:
+    (F, 3) 归一化法向量, 退化三角形返回 [0, 0, 1]
+    """
+    normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    norms = np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.where(norms > 0, normals / np.where(norms > 0, norms, 1.0), np.array([0.0, 0.0, 1.0]))
+
+def calculate_lightings(normals: np.ndarray, light_dir, light_color, ambient_intensity=0.2):
+    """批量计算光照颜色, 与 calculate_lighting 结果一致
+
+    返回:
+    (F, 3) 整数颜色数组
+    """
+    diffuse_intensity = np.maximum(0.0, normals @ np.asarray(light_dir, dtype=float))
+    intensity = ambient_intensity + diffuse_intensity * (1 - ambient_intensity)
+    return np.minimum(255, (np.asarray(light_color, dtype=float) * intensity[:, None]).astype(np.int64))
+
+def parallelogram_matrices_from(origins: np.ndarray, v1: np.ndarray, v2: np.ndarray, scale: float = 40.0):
+    """由原点和两条边向量批量计算平行四边形的变换矩阵
+
+    等价于 Transform3D().translate(*o).transform(*basis).scale(scale, scale, scale),
+    其中 basis 的前两列为 v1, v2
+
+    返回:
+    (..., 4, 4) 行主序变换矩阵
+    """
+    matrices = np.zeros((*origins.shape[:-1], 4, 4))
+    matrices[..., :3, 0] = v1 * scale
+    matrices[..., :3, 1] = v2 * scale
+    matrices[..., 2, 2] = scale
+    matrices[..., :3, 3] = origins
+    matrices[..., 3, 3] = 1.0
+    return matrices
+
+def parallelogram_matrices(tris: np.ndarray, scale: float = 40.0):
+    """批量计算每个三角形三个平行四边形的变换矩阵
+
+    参数:
+    tris - (F, 3, 3) 已缩放的三角形顶点数组
+
+    返回:
+    origins - (F, 3, 3) 每个平行四边形的原点
+    matrices - (F, 3, 4, 4) 行主序变换矩阵
+    """
+    v1 = np.roll(tris, -1, axis=1) - tris
+    v2 = np.roll(tris, -2, axis=1) - tris
+    return tris, parallelogram_matrices_from(tris, v1, v2, scale)
+
+SUMMON_PARALLELOGRAM_TEMPLATE = (
+    "summon text_display %.5f %.5f %.5f "
+    "{\"background\": %dl, \"text\": \" \", \"transformation\": ["
+    + ",".join(["%.5f"] * 16)
+    + "], \"Tags\": []}"
+)
+
+def _format_fixed(values: np.ndarray, digits: int):
+    """将 (N,) 数组格式化为定点小数字符矩阵, 与 "%.{digits}f" 一致 (不输出 -0)
+
+    返回:
+    (N, W) uint8 数组, 填充位置为 0
+    """
+    scale = 10 ** digits
+    q = np.rint(np.abs(values) * scale).astype(np.int64)
+    ip = q // scale
+    fp = (q - ip * scale).astype(np.uint32)
+    ip = ip.astype(np.uint32 if ip.max(initial=0) < 2 ** 32 else np.int64)
+    idigits = len(str(int(ip.max(initial=0))))
+
+    out = np.zeros((len(values), 1 + idigits + (digits + 1 if digits else 0)), dtype=np.uint8)
+    out[:, 0] = ((values < 0) & (q != 0)) * ord("-")
+
+    # 整数部分, 前导零置为 0 以便最后整体删除
+    for i in range(idigits):
+        p = 10 ** (idigits - 1 - i)
+        hi = ip // p
+        out[:, 1 + i] = (hi - hi // 10 * 10 + ord("0")) * ((hi > 0) | (p == 1))
+
+    if digits:
+        out[:, 1 + idigits] = ord(".")
+        for i in range(digits):
+            hi = fp // 10 ** (digits - 1 - i)
+            out[:, 2 + idigits + i] = hi - hi // 10 * 10 + ord("0")
+
+    return out
+
+def bulk_format(template: str, rows: np.ndarray):
+    """对 (N, K) 数组的每一行执行 template % tuple(row)
+
+    template 中只允许 %.Nf 与 %d 占位符, 整个过程在字节矩阵上完成, 不逐行格式化
+    """
+    parts = re.split(r"%(\.\d+f|d)", template)
+    literals, specs = parts[::2], parts[1::2]
+    if len(specs) != rows.shape[1]:
+        raise ValueError("template placeholders do not match row width")
+
+    n = rows.shape[0]
+    blocks = []
+    for i, literal in enumerate(literals):
+        if literal:
+            blocks.append(np.broadcast_to(np.frombuffer(literal.encode(), dtype=np.uint8), (n, len(literal.encode()))))
+        if i < len(specs):
+            blocks.append(_format_fixed(rows[:, i], 0 if specs[i] == "d" else int(specs[i][1:-1])))
+    blocks.append(np.full((n, 1), ord("\n"), dtype=np.uint8))
+
+    buf = np.concatenate(blocks, axis=1).ravel()
+    return buf[buf != 0].tobytes().decode().split("\n")[:-1]
+
+def format_parallelogram_commands(origins: np.ndarray, matrices: np.ndarray, argb: np.ndarray):
+    """由 (N, 3) 原点, (N, 4, 4) 矩阵和 (N,) ARGB 颜色批量生成 summon 命令"""
+    rows = np.concatenate([
+        origins.reshape(-1, 3),
+        argb.reshape(-1, 1).astype(float),
+        matrices.reshape(-1, 16)
+    ], axis=1)
+    return bulk_format(SUMMON_PARALLELOGRAM_TEMPLATE, rows)
+
+def _to_argb(colors: np.ndarray):
+    return (0xff << 24) | (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+
+def build_parallelograms(tris: np.ndarray, base_color=(0x39, 0xbb, 0xc5),
+                         light_dir=(0.5, 0.7, 0.5), light_color=(255, 255, 255),
+                         ambient_intensity=0.3, quads: np.ndarray|None = None):
+    """计算渲染所需的全部平行四边形
+
+    参数:
+    tris - (F, 3, 3) 三角形顶点数组
+    quads - (Q, 4, 3) 平行四边形顶点数组 (a, b, c, d 依次相邻), 每个只需一个实体
+
+    返回:
+    origins - (N, 3), matrices - (N, 4, 4), argb - (N,), N = 3F + Q
+    """
+    tris = np.asarray(tris, dtype=float).reshape(-1, 3, 3)
+    light_dir = np.asarray(light_dir, dtype=float)
+    light_dir = light_dir / np.linalg.norm(light_dir)
+
+    colors = calculate_lightings(calculate_normals(tris), light_dir, base_color, ambient_intensity)
+    origins, matrices = parallelogram_matrices(tris / 2)
+    origins, matrices = origins.reshape(-1, 3), matrices.reshape(-1, 4, 4)
+    argb = np.repeat(_to_argb(colors), 3)
+
+    if quads is not None and len(quads):
+        quads = np.asarray(quads, dtype=float) / 2
+        colors = calculate_lightings(calculate_normals(quads[:, :3]), light_dir, base_color, ambient_intensity)
+        quad_origins = quads[:, 0]
+        origins = np.concatenate([origins, quad_origins])
+        matrices = np.concatenate([
+            matrices,
+            parallelogram_matrices_from(quad_origins, quads[:, 1] - quad_origins, quads[:, 3] - quad_origins)
+        ])
+        argb = np.concatenate([argb, _to_argb(colors)])
+
+    return origins, matrices, argb
+
+def summon_triangles_with_lighting(tris: np.ndarray, base_color=(0x39, 0xbb, 0xc5),
+                                   light_dir=(0.5, 0.7, 0.5), light_color=(255, 255, 255),
+                                   ambient_intensity=0.3, quads: np.ndarray|None = None):
+    """summon_triangle_with_lighting 的批量版本
+
+    返回:
+    summon 命令列表, 每个三角形 3 条, 每个平行四边形 1 条
+    """
+    return format_parallelogram_commands(*build_parallelograms(
+        tris, base_color, light_dir, light_color, ambient_intensity, quads
+    ))
+
+class DisplayEntityManager:
+    """管理一组带标签的 text_display 实体, 重复渲染时原地更新而不是重新生成
+
+    每个槽位对应一个实体, 实体 UUID 由管理器前缀和槽位号直接拼出,
+    因此槽位表只需保存锚点, 矩阵和颜色三个数组, UUID 与槽位可互相换算.
+    实体生成后位置 (锚点) 不再改变, 之后的移动全部折算进 transformation 的平移分量,
+    这样客户端可以对变化做插值.
+    """
     
-    _tellraw(server, sender, {"text": "正在渲染带光照的3D模型...", "color": "green"})
+    def __init__(self, name: str, interpolation: int = 2):
+        if not re.fullmatch(r"[a-z0-9_]+", name):
+            raise ValueError("display entity group name must match [a-z0-9_]+")
+        
+        self.name = name
+        self.tag = f"mscr_display_{name}"
+        self.interpolation = interpolation
+        
+        prefix = uuid.uuid4().int & ~0xffffffff
+        self._uuid_ints = [
+            (prefix >> 96) & 0xffffffff, (prefix >> 64) & 0xffffffff,
+            (prefix >> 32) & 0xffffffff
+        ]
+        self._uuid_ints = [x - (1 << 32) if x >= 1 << 31 else x for x in self._uuid_ints]
+        self._uuid_prefix = str(uuid.UUID(int=prefix))[:-8]
+        
+        self.anchors = np.zeros((0, 3))
+        self.matrices = np.zeros((0, 4, 4))
+        self.argb = np.zeros(0, dtype=np.int64)
+    
+    def __len__(self):
+        return len(self.anchors)
+    
+    def entity_uuid(self, slot: int):
+        return f"{self._uuid_prefix}{slot:08x}"
+    
+    def slot_of(self, entity_uuid: str):
+        if not entity_uuid.startswith(self._uuid_prefix): return None
+        slot = int(entity_uuid[-8:], 16)
+        return slot if slot < len(self) else None
+    
+    def _summon_commands(self, slots: np.ndarray):
+        template = (
+            "summon text_display %.5f %.5f %.5f "
+            "{\"background\": %dl, \"text\": \" \", \"transformation\": ["
+            + ",".join(["%.5f"] * 16)
+            + f"], \"interpolation_duration\": {self.interpolation}, "
+            + "\"UUID\": [I; %d, %d, %d, %d], "
+            + f"\"Tags\": [\"{self.tag}\"]}}"
+        )
+        rows = np.concatenate([
+            self.anchors[slots],
+            self.argb[slots, None].astype(float),
+            self.matrices[slots].reshape(-1, 16),
+            np.broadcast_to(np.array(self._uuid_ints, dtype=float), (len(slots), 3)),
+            slots[:, None].astype(float)
+        ], axis=1)
+        return bulk_format(template, rows)
+    
+    def _merge_commands(self, slots: np.ndarray):
+        template = (
+            "{\"background\": %dl, \"transformation\": ["
+            + ",".join(["%.5f"] * 16)
+            + f"], \"start_interpolation\": 0, \"interpolation_duration\": {self.interpolation}}}"
+        )
+        rows = np.concatenate([
+            self.argb[slots, None].astype(float),
+            self.matrices[slots].reshape(-1, 16)
+        ], axis=1)
+        return [
+            f"data merge entity {self.entity_uuid(slot)} {nbt}"
+            for slot, nbt in zip(slots.tolist(), bulk_format(template, rows))
+        ]
     
+    def update(self, origins: np.ndarray, matrices: np.ndarray, argb: np.ndarray, eps: float = 1e-4):
+        """将实体组更新为新的一组平行四边形, 返回需要执行的命令
+
+        已有槽位只对变化的实体发送 data merge, 多出的生成, 不再需要的删除
+        """
+        n, old = len(origins), len(self)
+        keep = min(n, old)
+        
+        # 把新的平移折算到已有实体的锚点上
+        matrices = np.array(matrices, dtype=float).reshape(-1, 4, 4)
+        matrices[:keep, :3, 3] += origins[:keep] - self.anchors[:keep]
+        
+        changed = np.flatnonzero(
+            (np.abs(matrices[:keep] - self.matrices[:keep]).reshape(keep, 16).max(axis=1, initial=0) > eps)
+            | (argb[:keep] != self.argb[:keep])
+        )
+        commands_kill = [f"kill {self.entity_uuid(slot)}" for slot in range(n, old)]
+        
+        self.anchors = np.concatenate([self.anchors[:keep], origins[keep:]])
+        self.matrices = matrices
+        self.argb = np.asarray(argb, dtype=np.int64).copy()
+        
+        return (
+            self._merge_commands(changed)
+            + self._summon_commands(np.arange(keep, n))
+            + commands_kill
+        )
+    
+    def transformed(self, rotation: np.ndarray, center):
+        """返回整体绕 center 旋转后的 (origins, matrices), 锚点不变"""
+        center = np.asarray(center, dtype=float)
+        matrices = self.matrices.copy()
+        matrices[:, :3, :3] = rotation @ self.matrices[:, :3, :3]
+        world = self.anchors + self.matrices[:, :3, 3]
+        matrices[:, :3, 3] = (world - center) @ rotation.T + center - self.anchors
+        return self.anchors, matrices
+    
+    def center(self):
+        return (self.anchors + self.matrices[:, :3, 3]).mean(axis=0) if len(self) else np.zeros(3)
+    
+    def clear(self):
+        self.anchors = np.zeros((0, 3))
+        self.matrices = np.zeros((0, 4, 4))
+        self.argb = np.zeros(0, dtype=np.int64)
+        return [f"kill @e[type=text_display,tag={self.tag}]"]
+
+display_groups: dict[str, DisplayEntityManager] = {}
+
+def cull_backfaces(tris: np.ndarray, viewpoint):
+    """背面剔除, 返回朝向视点的面的布尔掩码"""
+    to_view = np.asarray(viewpoint, dtype=float) - tris.mean(axis=1)
+    return np.einsum("ij,ij->i", calculate_normals(tris), to_view) > 0
+
+def cull_occluded(vertices: np.ndarray, faces: np.ndarray, viewpoint):
+    """遮挡剔除: 从视点向每个面的中心发射射线, 只保留第一个被击中的面"""
+    import trimesh
+
+    mesh = trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+    centers = mesh.triangles_center
+    directions = centers - np.asarray(viewpoint, dtype=float)
+    origins = np.broadcast_to(np.asarray(viewpoint, dtype=float), centers.shape)
+    first_hit = mesh.ray.intersects_first(origins, directions)
+    return (first_hit == np.arange(len(faces))) | (first_hit == -1)
+
+def cluster_decimate(vertices: np.ndarray, faces: np.ndarray, target_faces: int):
+    """顶点聚类简化, 在没有二次误差简化后端时使用
+
+    二分搜索网格分辨率, 取面数不超过 target_faces 的最精细网格
+    若任何分辨率都无法在不丢光所有面的前提下满足 target_faces, 返回面数不为 0 的最粗网格
+    """
+    vmin = vertices.min(axis=0)
+    extent = max(float((vertices.max(axis=0) - vmin).max()), 1e-9)
+
+    def clustered(res: int):
+        cells = np.minimum(((vertices - vmin) / extent * res).astype(np.int64), res - 1)
+        _, inverse, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        new_vertices = np.zeros((len(counts), 3))
+        np.add.at(new_vertices, inverse, vertices)
+        new_vertices /= counts[:, None]
+
+        new_faces = inverse[faces]
+        new_faces = new_faces[
+            (new_faces[:, 0] != new_faces[:, 1])
+            & (new_faces[:, 1] != new_faces[:, 2])
+            & (new_faces[:, 0] != new_faces[:, 2])
+        ]
+        _, first = np.unique(np.sort(new_faces, axis=1), axis=0, return_index=True)
+        return new_vertices, new_faces[np.sort(first)]
+
+    lo, hi = 1, 1024
+    best = clustered(lo)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        result = clustered(mid)
+        if len(result[1]) <= target_faces:
+            lo, best = mid, result
+        else:
+            hi = mid - 1
+
+    if len(best[1]) == 0:
+        lo, hi = 1, 1024
+        while lo < hi:
+            mid = (lo + hi) // 2
+            result = clustered(mid)
+            if len(result[1]) > 0:
+                hi, best = mid, result
+            else:
+                lo = mid + 1
+        if len(best[1]) == 0: best = clustered(lo)
+
+    return best
+
+_quadric_fallback_logged = False
+
+def decimate(vertices: np.ndarray, faces: np.ndarray, target_faces: int):
+    """简化网格到 target_faces 个面以内
+
+    优先使用 trimesh 的二次误差简化 (需要额外安装 fast_simplification), 后端不可用时退回顶点聚类
+
+    返回:
+    vertices, faces, 使用的方法名
+    """
+    if len(faces) <= target_faces:
+        return vertices, faces, "none"
+
+    try:
+        import trimesh
+
+        mesh = trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+        simplified = mesh.simplify_quadric_decimation(face_count=target_faces)
+        if 0 < len(simplified.faces) <= target_faces:
+            return np.asarray(simplified.vertices), np.asarray(simplified.faces), "quadric"
+    except Exception as e:
+        global _quadric_fallback_logged
+        if not _quadric_fallback_logged:
+            _quadric_fallback_logged = True
+            logging.warning(f"quadric decimation unavailable ({e!r}), falling back to vertex clustering; install fast_simplification for better quality")
+
+    vertices, faces = cluster_decimate(vertices, faces, target_faces)
+    return vertices, faces, "cluster"
+
+def merge_coplanar(vertices: np.ndarray, faces: np.ndarray, eps: float = 1e-6):
+    """将共享一条边且拼成平行四边形的两个三角形合并为一个平行四边形
+
+    返回:
+    quads - (Q, 4, 3) 平行四边形顶点
+    rest - 未合并的面的下标
+    """
+    edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    opposite = np.concatenate([faces[:, 2], faces[:, 0], faces[:, 1]])
+    owner = np.tile(np.arange(len(faces)), 3)
+
+    keys = np.sort(edges, axis=1)
+    order = np.lexsort((keys[:, 1], keys[:, 0]))
+    keys, edges, opposite, owner = keys[order], edges[order], opposite[order], owner[order]
+    shared = np.flatnonzero((keys[1:] == keys[:-1]).all(axis=1))
+
+    a, b = shared, shared + 1
+    u, v = vertices[edges[a, 0]], vertices[edges[a, 1]]
+    w1, w2 = vertices[opposite[a]], vertices[opposite[b]]
+
+    scale = np.maximum(np.abs(u - v).max(axis=1), eps)
+    is_parallelogram = (np.abs(w1 + w2 - u - v).max(axis=1) <= eps * scale)
+    normals = calculate_normals(vertices[faces])
+    same_side = np.einsum("ij,ij->i", normals[owner[a]], normals[owner[b]]) > 0
+    candidates = np.flatnonzero(is_parallelogram & same_side & (owner[a] != owner[b]))
+
+    used = np.zeros(len(faces), dtype=bool)
+    quads = []
+    for i in candidates.tolist():
+        f1, f2 = owner[a[i]], owner[b[i]]
+        if used[f1] or used[f2]: continue
+        used[f1] = used[f2] = True
+        # 保持第一个三角形的绕序: w1 -> u -> w2 -> v
+        quads.append((w1[i], u[i], w2[i], v[i]))
+
+    return np.array(quads).reshape(-1, 4, 3), np.flatnonzero(~used)
+
+def plan_lod(vertices: np.ndarray, faces: np.ndarray, budget: int, viewpoint=None, occlusion: bool = False):
+    """渲染前的网格简化: 剔除, 合并共面面片, 按实体预算简化
+
+    每个三角形需要 3 个实体, 每个合并后的平行四边形需要 1 个实体
+    预算小到只能把网格简化为空时, 停在面数不为 0 的最粗结果上, 报告中 budget_met 为 False
+
+    返回:
+    tris - (F, 3, 3), quads - (Q, 4, 3), 报告字典
+    """
+    original_faces = len(faces)
+    vertices = np.asarray(vertices, dtype=float)
+    faces = np.asarray(faces, dtype=np.int64)
+
+    if viewpoint is not None:
+        keep = cull_backfaces(vertices[faces], viewpoint)
+        if occlusion and keep.any():
+            keep[keep] = cull_occluded(vertices, faces[keep], viewpoint)
+        faces = faces[keep]
+    visible_faces = len(faces)
+
+    method = "none"
+    quads, rest = merge_coplanar(vertices, faces)
+    entities = len(quads) + 3 * len(rest)
+    target = len(faces)
+    while entities > budget and target > 1:
+        target = max(1, int(target * budget / entities * 0.95))
+        new_vertices, new_faces, new_method = decimate(vertices, faces, target)
+        if len(new_faces) == 0 or len(new_faces) >= len(faces): break
+        vertices, faces, method = new_vertices, new_faces, new_method
+        quads, rest = merge_coplanar(vertices, faces)
+        entities = len(quads) + 3 * len(rest)
+
+    return vertices[faces[rest]], quads, {
+        "entities": entities,
+        "original_faces": original_faces,
+        "visible_faces": visible_faces,
+        "faces": len(faces),
+        "quads": len(quads),
+        "quality": len(faces) / visible_faces if visible_faces else 1.0,
+        "method": method,
+        "budget_met": entities <= budget
+    }
+
+def prepare_model(path: str, offset: tuple[float, float, float], budget: int, viewpoint=None, occlusion: bool = False):
+    """加载模型, 按预算简化并计算每个实体的位置, 变换矩阵和颜色
+
+    可在工作进程中执行, 返回:
+    origins, matrices, argb, 报告字典
+    """
     import trimesh
     
-    mesh = trimesh.load(tokens[0])
-    topy = lambda p: tuple(map(lambda x, y: x + y, tuple(map(float, p)), map(float, tokens[1].split(","))))
+    mesh = trimesh.load(path)
     
     # 设置光照参数
     light_dir = (0.5, 0.7, 0.5)  # 光源方向
     light_color = (255, 255, 255)  # 白光
     ambient_intensity = 0.3  # 环境光强度
     
-    for face in mesh.faces:
-        p1, p2, p3 = mesh.vertices[face]
-        # 使用带光照的三角形渲染函数
-        summon_triangle_with_lighting(
-            server, 
-            topy(p1), topy(p2), topy(p3), 
-            base_color=color,
-            light_dir=light_dir,
-            light_color=light_color,
-            ambient_intensity=ambient_intensity
-        )
+    vertices = mesh.vertices + np.array(offset)
+    tris, quads, report = plan_lod(vertices, mesh.faces, budget, viewpoint, occlusion)
+    origins, matrices, argb = build_parallelograms(
+        tris,
+        base_color=color,
+        light_dir=light_dir,
+        light_color=light_color,
+        ambient_intensity=ambient_intensity,
+        quads=quads
+    )
+    return origins, matrices, argb, report
+
+def _pop_option(tokens: list[str], name: str, default=None):
+    if name not in tokens: return default
+    i = tokens.index(name)
+    value = tokens[i + 1]
+    del tokens[i:i + 2]
+    return value
+
+def main(server, sender, tokens: list[str]):
+    budget = int(_pop_option(tokens, "--budget", gvars["config"].get("3dtest_entity_budget", 30000)))
+    viewpoint = _pop_option(tokens, "--view")
+    group = _pop_option(tokens, "--name")
+    occlusion = "--occlusion" in tokens
+    tokens = [t for t in tokens if t != "--occlusion"]
+    
+    if len(tokens) < 2:
+        _tellraw(server, sender, {"text": "usage: 3dtest <filepath> <x,y,z> [--budget <entities>] [--view <x,y,z> [--occlusion]] [--name <group>]", "color": "red"})
+        return
     
-    cmds = server.waiting_commands.copy()
-    pocket = []
-    for cmd in tqdm(cmds):
-        if len(pocket) > 5000:
-            server.run_command_byfunc("\n".join(pocket))
-            pocket.clear()
+    _tellraw(server, sender, {"text": "正在渲染带光照的3D模型...", "color": "green"})
+    
+    offset = tuple(map(float, tokens[1].split(",")))
+    if viewpoint is not None:
+        viewpoint = tuple(map(float, viewpoint.split(",")))
+    
+    tracer = gvars["tracer"]
+    with tracer.span("3dtest:prepare", "prepare", budget=budget):
+        origins, matrices, argb, report = gvars["plugin_workers"].run(
+            prepare_model, tokens[0], offset, budget, viewpoint, occlusion
+        ).result()
+    
+    with tracer.span("3dtest:format", "format", entities=len(origins)):
+        if group is None:
+            cmds = format_parallelogram_commands(origins, matrices, argb)
+        else:
+            if group not in display_groups:
+                display_groups[group] = DisplayEntityManager(group)
+            cmds = display_groups[group].update(origins, matrices, argb)
+    
+    pocket_size = 5000
+    for i in tqdm(range(0, len(cmds), pocket_size)):
+        if i > 0:
             input("enter to continue")
-            
-        pocket.append(cmd)
+        
+        server.run_command_byfunc("\n".join(cmds[i:i + pocket_size]))
+    
+    _tellraw(server, sender, {
+        "text": (
+            f"已渲染 {len(origins)} 个实体 (预算 {budget}, 命令 {len(cmds)} 条), "
+            f"面数 {report["faces"]}/{report["original_faces"]} (可见 {report["visible_faces"]}), "
+            f"合并平行四边形 {report["quads"]}, 质量 {report["quality"]:.0%}, 简化方式 {report["method"]}"
+            + ("" if report["budget_met"] else ", 预算过小, 已使用可达到的最粗网格")
+        ),
+        "color": "aqua" if report["budget_met"] else "yellow"
+    })
+    
+def spin(server, sender, tokens: list[str]):
+    if len(tokens) < 2 or tokens[0] not in display_groups:
+        _tellraw(server, sender, {"text": "usage: 3dtest-spin <group> <degrees> [frames=20] [interval-ticks=2]", "color": "red"})
+        return
     
-    if pocket:
-        server.run_command_byfunc("\n".join(pocket))
+    group = display_groups[tokens[0]]
+    frames = int(tokens[2]) if len(tokens) > 2 else 20
+    interval = int(tokens[3]) if len(tokens) > 3 else 2
     
-    _tellraw(server, sender, {"text": "已渲染", "color": "aqua"})
+    step = Transform3D().rotateDegreeY(float(tokens[1]) / frames).matrix
+    rotation = np.array(step).reshape(4, 4)[:3, :3]
+    center = group.center()
+    group.interpolation = interval
     
+    start = time.perf_counter()
+    for frame in range(frames):
+        server.run_commands(group.update(*group.transformed(rotation, center), group.argb))
+        time.sleep(max(0.0, start + (frame + 1) * interval / 20 - time.perf_counter()))
+
+def clear(server, sender, tokens: list[str]):
+    if not tokens or tokens[0] not in display_groups:
+        _tellraw(server, sender, {"text": "usage: 3dtest-clear <group>", "color": "red"})
+        return
+    
+    server.run_commands(display_groups.pop(tokens[0]).clear())
+    _tellraw(server, sender, {"text": f"已清除 {tokens[0]}", "color": "aqua"})
+
 def __getattr__(name: str) -> typing.Any: return globals().get(name, lambda *args, **kwargs: None)
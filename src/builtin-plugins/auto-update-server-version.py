@@ -15,8 +15,6 @@ def loghooker(packer):
     if "Starting minecraft server version" in packer.obj:
         gvars = _globals()
         gvars["config"]["server_version"] = packer.obj.split(" ")[-1]
-        gvars["reload"]()
-        gvars["save_config"]()
         logging.info(f"Updated server version to {gvars["config"]["server_version"]}")
         del globals()["loghooker"]
 
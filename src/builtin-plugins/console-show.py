@@ -1,10 +1,18 @@
 import typing
 import json
 import time
+import queue
+import threading
+import struct
+import zlib
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
-from PIL import Image
+import numpy as np
 
+plugin_meta = {"lazy": True, "commands": ["conshow"], "allow_users_key": "console_show_admins"}
 conshow_admins: list[str]
 startswith = "conshow"
 
@@ -14,18 +22,31 @@ CONSHOW_HELP = f'''\
 命令列表:
 help - 查看帮助
 show-img <path> <width> <height> [--target <player-selector>] [--runin-datapack] - 在控制台显示图片
-show-video <path> <width> <height> [--target <player-selector>] - 在控制台显示视频
+show-video <path> <width> <height> [--target <player-selector>] [--encoders <n>] [--delta] - 在控制台显示视频, 有预渲染缓存时直接读取缓存
+prerender-video <path> <width> <height> - 预渲染视频到磁盘缓存
+stop-video - 停止正在播放的视频
+
+show-img, show-video 与 prerender-video 可选:
+--palette <k> - 量化为 k 色调色板 (视频所有帧共用)
+--max-bytes <n> - 单帧命令字节上限, 超出时依次缩小调色板和分辨率
+--delta - (show-video) 画面没有变化的帧不发送
 \
 '''
 
 def init(f: typing.Callable[[], dict[str, typing.Any]]):
-    global conshow_admins
+    global conshow_admins, palette_default, max_bytes_default, cache_dir, asset_cache, plugin_workers, config
     
     gvars = f()
     config = gvars["config"]
     conshow_admins = config.get("console_show_admins", [])
+    palette_default = config.get("console_show_palette_size", None)
+    max_bytes_default = config.get("console_show_max_bytes", None)
+    cache_dir = config.get("console_show_cache_dir", "./console-show-cache")
+    asset_cache = gvars["asset_cache"]
+    plugin_workers = gvars["plugin_workers"]
+    config.subscribe(["console_show_admins", "console_show_palette_size", "console_show_max_bytes"], _on_config)
     
-    gvars["plugin_commands"].append(gvars["PluginCommand"](startswith=startswith, callback=main, allow_users=conshow_admins))
+    gvars["plugin_commands"].append(gvars["PluginCommand"](startswith=startswith, callback=main, allow_users=conshow_admins, need_async=True))
     
     return {
         "name": "console-show",
@@ -33,97 +54,476 @@ def init(f: typing.Callable[[], dict[str, typing.Any]]):
         "description": "Show Something In Minecraft Console."
     }
 
+def _on_config(key: str, value: typing.Any):
+    global palette_default, max_bytes_default
+    
+    match key:
+        case "console_show_admins": conshow_admins[:] = value or []
+        case "console_show_palette_size": palette_default = value
+        case "console_show_max_bytes": max_bytes_default = value
+
+def close():
+    config.unsubscribe(_on_config)
+
 def _tellraws_creater(target: str, raw: dict):
     return f"tellraw {target} {json.dumps(raw, ensure_ascii=False)}"
 
 def _tellraws(server, target: str, raw: dict):
     return server.run_command(_tellraws_creater(target, raw))
 
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_SPAN_HEAD = np.frombuffer(b'{"text":"', dtype=np.uint8)
+_SPAN_COLOR = np.frombuffer(b'","color":"#', dtype=np.uint8)
+_SPAN_TAIL = np.frombuffer(b'"},', dtype=np.uint8)
+_SQUARE = np.frombuffer("■".encode(), dtype=np.uint8)
+_NEWLINE = np.frombuffer(b"\\n", dtype=np.uint8)
+
+def _place(buf: np.ndarray, starts: np.ndarray, pattern: np.ndarray):
+    buf[starts[:, None] + np.arange(len(pattern))] = pattern
+
+def _frame_spans(rgb: np.ndarray):
+    h, w = rgb.shape[:2]
+    packed = (rgb[..., 0].astype(np.uint32) << 16) | (rgb[..., 1].astype(np.uint32) << 8) | rgb[..., 2]
+    change = np.ones((h, w), dtype=bool)
+    change[:, 1:] = packed[:, 1:] != packed[:, :-1]
+    starts = np.flatnonzero(change)
+    lengths = np.diff(starts, append=h * w)
+    colors = packed.ravel()[starts]
+    row_end = (starts + lengths) % w == 0
+    span_len = len(_SPAN_HEAD) + lengths * len(_SQUARE) + row_end * len(_NEWLINE) + len(_SPAN_COLOR) + 6 + len(_SPAN_TAIL)
+    return starts, lengths, colors, row_end, span_len
+
+def encoded_size(rgb: np.ndarray):
+    # encode_frame 输出的字节数, 不实际生成文本
+    return int(_frame_spans(rgb)[-1].sum()) + 1
+
+def encode_rows(rgb: np.ndarray):
+    # 把 (H, W, 3) 的 RGB 帧编码为 tellraw 组件, 每行返回一段以逗号分隔的 JSON 组件文本
+    # 每行按颜色变化切成若干段, 每段一个组件, 全部在字节缓冲区上向量化完成
+    starts, lengths, colors, row_end, span_len = _frame_spans(rgb)
+    offsets = np.cumsum(span_len) - span_len
+    buf = np.empty(int(span_len.sum()), dtype=np.uint8)
+    
+    _place(buf, offsets, _SPAN_HEAD)
+    pos = offsets + len(_SPAN_HEAD)
+    nth = np.arange(int(lengths.sum())) - np.repeat(starts, lengths)
+    _place(buf, np.repeat(pos, lengths) + nth * len(_SQUARE), _SQUARE)
+    pos = pos + lengths * len(_SQUARE)
+    _place(buf, pos[row_end], _NEWLINE)
+    pos = pos + row_end * len(_NEWLINE)
+    _place(buf, pos, _SPAN_COLOR)
+    pos = pos + len(_SPAN_COLOR)
+    buf[pos[:, None] + np.arange(6)] = _HEX_DIGITS[(colors[:, None] >> np.arange(20, -1, -4, dtype=np.uint32)) & 0xf]
+    _place(buf, pos + 6, _SPAN_TAIL)
+    
+    data = buf.tobytes()
+    bounds = [0, *(offsets[row_end] + span_len[row_end]).tolist()]
+    return [data[a:b - 1].decode() for a, b in zip(bounds, bounds[1:])]
+
+def join_rows(rows: list[str]):
+    return f"[{",".join(rows)}]"
+
+def encode_frame(rgb: np.ndarray):
+    # 整帧的 tellraw 组件列表 JSON 文本
+    return join_rows(encode_rows(rgb))
+
+def median_cut(pixels: np.ndarray, k: int):
+    # 中位切分: 反复把颜色范围最大的盒子沿最宽的通道从中位数处一分为二
+    boxes = [pixels]
+    while len(boxes) < k:
+        ranges = [int(np.ptp(box, axis=0).max()) if len(box) > 1 else -1 for box in boxes]
+        i = int(np.argmax(ranges))
+        if ranges[i] <= 0: break
+        
+        box = boxes.pop(i)
+        box = box[np.argsort(box[:, int(np.ptp(box, axis=0).argmax())], kind="stable")]
+        boxes += [box[:len(box) // 2], box[len(box) // 2:]]
+    
+    return np.array([box.mean(axis=0) for box in boxes]).round().astype(np.uint8)
+
+class FrameFormat:
+    # 帧的尺寸和调色板, 视频的所有帧共用同一份
+    # 设置了 max_bytes 时, 先缩小调色板再降低分辨率, 直到所有样本帧的编码大小都不超过预算
+    
+    MIN_PALETTE = 4
+    
+    def __init__(self, size: tuple[int, int], palette_size: int|None = None, max_bytes: int|None = None, overhead: int = 0):
+        self.size = size
+        self.palette_size = palette_size
+        self.max_bytes = max_bytes
+        self.overhead = overhead
+        self.palette: np.ndarray|None = None
+    
+    def render(self, rgb: np.ndarray, size: tuple[int, int]|None = None, palette: np.ndarray|None = None):
+        size = size if size is not None else self.size
+        palette = palette if palette is not None else self.palette
+        
+        rgb = cv2.resize(np.ascontiguousarray(rgb), size, interpolation=cv2.INTER_AREA)
+        if palette is None: return rgb
+        
+        dist = ((rgb.reshape(-1, 1, 3).astype(np.int32) - palette[None].astype(np.int32)) ** 2).sum(axis=2)
+        return palette[dist.argmin(axis=1)].reshape(rgb.shape)
+    
+    def prepare(self, samples: list[np.ndarray]):
+        pixels = np.concatenate([
+            cv2.resize(np.ascontiguousarray(s), self.size, interpolation=cv2.INTER_AREA).reshape(-1, 3)
+            for s in samples
+        ])
+        if len(pixels) > 20000:
+            pixels = pixels[np.random.default_rng(0).choice(len(pixels), 20000, replace=False)]
+        
+        palette_size = self.palette_size
+        self.palette = median_cut(pixels, palette_size) if palette_size else None
+        if self.max_bytes is None: return self
+        
+        size = self.size
+        while max(encoded_size(self.render(s, size)) for s in samples) + self.overhead > self.max_bytes:
+            if palette_size and palette_size > self.MIN_PALETTE:
+                palette_size = max(self.MIN_PALETTE, palette_size // 2)
+                self.palette = median_cut(pixels, palette_size)
+            elif size[0] > 1 or size[1] > 1:
+                size = (max(1, int(size[0] * 0.85)), max(1, int(size[1] * 0.85)))
+            else:
+                break
+        
+        self.size = size
+        self.palette_size = palette_size
+        return self
+    
+    def encode_rows(self, rgb: np.ndarray):
+        return encode_rows(self.render(rgb))
+    
+    def encode(self, rgb: np.ndarray):
+        return encode_frame(self.render(rgb))
+
+def encode_bgr(size: tuple[int, int], palette: np.ndarray|None, frame: np.ndarray):
+    # 供工作进程调用, 只接收可直接序列化的参数
+    fmt = FrameFormat(size)
+    fmt.palette = palette
+    return fmt.encode(frame[..., ::-1])
+
+def _sample_frames(path: str, n: int = 8):
+    cap = cv2.VideoCapture(path)
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 1
+    samples = []
+    for i in np.linspace(0, count - 1, n).astype(int).tolist():
+        cap.set(cv2.CAP_PROP_POS_FRAMES, i)
+        ret, frame = cap.read()
+        if ret: samples.append(frame[..., ::-1])
+    cap.release()
+    return samples
+
+def _hover_image_creater(target: str, contents: str):
+    return (
+        f'tellraw {target} {{"text": "鼠标悬停查看图片", "color": "yellow", "bold": true, "underlined": true, '
+        f'"hoverEvent": {{"action": "show_text", "contents": {contents}}}}}'
+    )
+
+class VideoStreamer:
+    # 解码线程 -> 编码线程池 -> 按时钟发送, 三段之间用有界队列连接
+    # 发送端按绝对时间对齐, 落后超过一帧的帧直接丢弃;
+    # 解码端根据编码耗时的估计跳过注定来不及的帧, 同时最多只让 encoders + 1 帧在编码中
+    
+    def __init__(self, server, path: str, fmt: FrameFormat, target: str, encoders: int = 2, queue_size: int = 8, delta: bool = False):
+        self.server = server
+        self.path = path
+        self.fmt = fmt
+        self.target = target
+        self.encoders = encoders
+        self.delta = delta
+        self.stopped = threading.Event()
+        
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._inflight = threading.Semaphore(encoders + 1)
+        self._start: float|None = None
+        self._ft = 0.0
+        self._latency = 0.0
+        self.total = 0
+        self.sent = 0
+        self.dropped = 0
+        self.unchanged = 0
+    
+    def _encode(self, frame):
+        return _hover_image_creater(self.target, plugin_workers.run(encode_bgr, self.fmt.size, self.fmt.palette, frame).result())
+    
+    def _late(self, idx: int, margin: float = 0.0):
+        return self._start is not None and time.perf_counter() + margin > self._start + (idx + 1) * self._ft
+    
+    def _submit(self, pool: ThreadPoolExecutor, idx: int, frame):
+        submitted = time.perf_counter()
+        
+        def done(_):
+            self._latency = self._latency * 0.8 + (time.perf_counter() - submitted) * 0.2
+            self._inflight.release()
+        
+        future = pool.submit(self._encode, frame)
+        future.add_done_callback(done)
+        self._queue.put((idx, future))
+    
+    def _decode(self, cap, pool: ThreadPoolExecutor):
+        idx = 0
+        try:
+            while not self.stopped.is_set():
+                self._inflight.acquire()
+                
+                while self._late(idx, self._latency) and cap.grab():
+                    self.dropped += 1
+                    idx += 1
+                
+                ret, frame = cap.read()
+                if not ret:
+                    self._inflight.release()
+                    break
+                
+                self._submit(pool, idx, frame)
+                idx += 1
+        finally:
+            self.total = idx
+            self._queue.put(None)
+    
+    def run(self):
+        cap = cv2.VideoCapture(self.path)
+        self._ft = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0)
+        
+        last_command = None
+        with ThreadPoolExecutor(self.encoders) as pool:
+            decoder = threading.Thread(target=self._decode, args=(cap, pool), daemon=True)
+            decoder.start()
+            
+            try:
+                while (item := self._queue.get()) is not None:
+                    idx, future = item
+                    command = future.result()
+                    
+                    if self._start is None:
+                        self._start = time.perf_counter() - idx * self._ft
+                    
+                    if self.stopped.is_set() or self._late(idx):
+                        self.dropped += 1
+                        continue
+                    
+                    if self.delta and command == last_command:
+                        self.unchanged += 1
+                        continue
+                    
+                    time.sleep(max(0.0, self._start + idx * self._ft - time.perf_counter()))
+                    self.server.run_command(command)
+                    self.sent += 1
+                    last_command = command
+            finally:
+                # 编码或发送出错时也要停止解码线程: 置停止标志, 并清空队列解除它在 put 上的阻塞
+                self.stopped.set()
+                while decoder.is_alive():
+                    try: self._queue.get(timeout=0.1)
+                    except queue.Empty: pass
+                cap.release()
+        return _stream_stats(self)
+
+def _stream_stats(streamer):
+    elapsed = time.perf_counter() - streamer._start if streamer._start is not None else 0.0
+    return {
+        "fps": (streamer.sent + streamer.unchanged) / elapsed if elapsed > 0 else 0.0,
+        "target_fps": 1.0 / streamer._ft,
+        "drop_rate": streamer.dropped / streamer.total if streamer.total else 0.0,
+        "sent": streamer.sent,
+        "unchanged": streamer.unchanged
+    }
+
+def _file_hash(path: str):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class VideoCache:
+    # 预渲染的视频缓存, 按 (文件哈希, 尺寸, 调色板, 字节预算) 区分
+    # 文件格式: MAGIC, u32 头长度, JSON 头, 然后每帧一条 u32 长度 + zlib 压缩的记录;
+    # 记录只包含相对上一帧变化的行: 若干个 (u16 行号, u32 长度, 行文本)
+    
+    MAGIC = b"MSCV1"
+    
+    def __init__(self, path: str, size: tuple[int, int], palette_size: int|None, max_bytes: int|None):
+        self.path = path
+        key = hashlib.sha256(f"{_file_hash(path)}:{size}:{palette_size}:{max_bytes}".encode()).hexdigest()
+        self.file = f"{cache_dir}/{key}.msv"
+    
+    def exists(self):
+        return os.path.isfile(self.file)
+    
+    def build(self, fmt: FrameFormat, stopped: threading.Event|None = None):
+        cap = cv2.VideoCapture(self.path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = f"{self.file}.tmp"
+        
+        frames = 0
+        with open(tmp_file, "wb") as f:
+            header = json.dumps({"fps": fps, "size": fmt.size, "palette_size": fmt.palette_size}).encode()
+            f.write(self.MAGIC + struct.pack("<I", len(header)) + header)
+            
+            prev: list[str] = []
+            while stopped is None or not stopped.is_set():
+                ret, frame = cap.read()
+                if not ret: break
+                
+                rows = fmt.encode_rows(frame[..., ::-1])
+                record = b"".join(
+                    struct.pack("<HI", i, len(data)) + data
+                    for i, row in enumerate(rows)
+                    if i >= len(prev) or prev[i] != row
+                    for data in (row.encode(),)
+                )
+                record = zlib.compress(record)
+                f.write(struct.pack("<I", len(record)) + record)
+                prev = rows
+                frames += 1
+        
+        cap.release()
+        if stopped is not None and stopped.is_set():
+            os.remove(tmp_file)
+            return 0
+        
+        os.replace(tmp_file, self.file)
+        return frames
+    
+    def frames(self):
+        # 逐帧产出 (完整行列表, 是否有变化)
+        with open(self.file, "rb") as f:
+            if f.read(len(self.MAGIC)) != self.MAGIC:
+                raise ValueError(f"invalid video cache: {self.file}")
+            
+            header = json.loads(f.read(struct.unpack("<I", f.read(4))[0]))
+            yield header
+            
+            rows: list[str] = []
+            while (raw_len := f.read(4)):
+                record = zlib.decompress(f.read(struct.unpack("<I", raw_len)[0]))
+                pos = 0
+                while pos < len(record):
+                    i, n = struct.unpack_from("<HI", record, pos)
+                    pos += 6
+                    if i >= len(rows): rows.extend([""] * (i + 1 - len(rows)))
+                    rows[i] = record[pos:pos + n].decode()
+                    pos += n
+                yield rows, len(record) > 0
+
+class CachedVideoPlayer:
+    # 从预渲染缓存播放, 只有读盘开销; 落后超过一帧的帧只更新状态不发送
+    
+    def __init__(self, server, cache: VideoCache, target: str, delta: bool = False):
+        self.server = server
+        self.cache = cache
+        self.target = target
+        self.delta = delta
+        self.stopped = threading.Event()
+        
+        self._start: float|None = None
+        self._ft = 0.0
+        self.total = 0
+        self.sent = 0
+        self.dropped = 0
+        self.unchanged = 0
+    
+    def run(self):
+        frames = self.cache.frames()
+        self._ft = 1.0 / next(frames)["fps"]
+        self._start = time.perf_counter()
+        
+        pending = False
+        for idx, (rows, changed) in enumerate(frames):
+            if self.stopped.is_set(): break
+            self.total += 1
+            pending = pending or changed
+            
+            if time.perf_counter() > self._start + (idx + 1) * self._ft:
+                self.dropped += 1
+                continue
+            
+            if self.delta and not pending:
+                self.unchanged += 1
+                continue
+            
+            time.sleep(max(0.0, self._start + idx * self._ft - time.perf_counter()))
+            self.server.run_command(_hover_image_creater(self.target, join_rows(rows)))
+            self.sent += 1
+            pending = False
+        
+        return _stream_stats(self)
+
+streamers: list[VideoStreamer|CachedVideoPlayer] = []
+
+def _play_video(server, sender: str, streamer: VideoStreamer|CachedVideoPlayer):
+    streamers.append(streamer)
+    try:
+        stats = streamer.run()
+        _tellraws(server, sender, {
+            "text": (
+                f"视频播放结束: {stats["fps"]:.1f}/{stats["target_fps"]:.1f} FPS, 丢帧率 {stats["drop_rate"]:.1%}, "
+                f"发送 {stats["sent"]} 帧, 未变化跳过 {stats["unchanged"]} 帧"
+            ),
+            "color": "green"
+        })
+    except Exception as e:
+        _tellraws(server, sender, {"text": f"发生错误: {repr(e)}", "color": "red"})
+    finally:
+        streamers.remove(streamer)
+
+def _option(tokens: list[str], name: str, default=None):
+    return default if name not in tokens else tokens[tokens.index(name) + 1]
+
 def main(server, sender: str, tokens: list[str]):
     try:
+        target = _option(tokens, "--target", sender)
+        palette_size = int(_option(tokens, "--palette", palette_default or 0)) or None
+        max_bytes = int(_option(tokens, "--max-bytes", max_bytes_default or 0)) or None
+        overhead = len(_hover_image_creater(target, "").encode())
+        
         match tokens[0]:
             case "help":
                 _tellraws(server, sender, {"text": CONSHOW_HELP})
             
             case "show-img":
-                im = Image.open(tokens[1]).convert("RGB").resize((int(tokens[2]), int(tokens[3])))
-                raw = [[] for _ in range(im.height)]
-                for y in range(im.height):
-                    for x in range(im.width):
-                        r, g, b = im.getpixel((x, y))
-                        color = f"#{r:02x}{g:02x}{b:02x}"
-                        lst = raw[y]
-                        
-                        if not lst:
-                            lst.append({"text": "■", "color": color})
-                            continue
-                        
-                        if lst[-1]["color"] == color:
-                            lst[-1]["text"] += "■"
-                        else:
-                            lst.append({"text": "■", "color": color})
-                            
-                    raw[y][-1]["text"] += "\n"
-                
-                target = sender if "--target" not in tokens else tokens[tokens.index("--target") + 1]
-                rawdata = {
-                    "text": "鼠标悬停查看图片",
-                    "color": "yellow",
-                    "bold": True, "underlined": True,
-                    "hoverEvent": {
-                        "action": "show_text",
-                        "contents": raw
-                    }
-                }
+                im = asset_cache.image(tokens[1])
+                fmt = FrameFormat((int(tokens[2]), int(tokens[3])), palette_size, max_bytes, overhead).prepare([im])
+                command = _hover_image_creater(target, fmt.encode(im))
                         
                 if "--runin-datapack" not in tokens:
-                    _tellraws(server, target, rawdata)
+                    server.run_command(command)
                 else:
-                    server.run_command_byfunc(_tellraws_creater(target, rawdata), False)
+                    server.run_command_byfunc(command, False)
             
             case "show-video":
-                cap = cv2.VideoCapture(tokens[1])
-                ft = 1.0 / cap.get(cv2.CAP_PROP_FPS)
+                encoders = int(_option(tokens, "--encoders", 2))
+                size = (int(tokens[2]), int(tokens[3]))
+                delta = "--delta" in tokens
                 
-                while True:
-                    st = time.time()
-                    
-                    ret, frame = cap.read()
-                    if not ret: break
-                    
-                    new_frame = cv2.resize(frame, (int(tokens[2]), int(tokens[3])))
-                    
-                    raw = [[] for _ in range(new_frame.shape[0])]
-                    
-                    for y in range(new_frame.shape[0]):
-                        for x in range(new_frame.shape[1]):
-                            b, g, r = new_frame[y, x]
-                            color = f"#{r:02x}{g:02x}{b:02x}"
-                            lst = raw[y]
-                        
-                            if not lst:
-                                lst.append({"text": "■", "color": color})
-                                continue
-                            
-                            if lst[-1]["color"] == color:
-                                lst[-1]["text"] += "■"
-                            else:
-                                lst.append({"text": "■", "color": color})
-                            
-                        raw[y][-1]["text"] += "\n"
+                cache = VideoCache(tokens[1], size, palette_size, max_bytes)
+                if cache.exists():
+                    streamer = CachedVideoPlayer(server, cache, target, delta)
+                else:
+                    fmt = FrameFormat(size, palette_size, max_bytes, overhead)
+                    if palette_size or max_bytes:
+                        fmt.prepare(_sample_frames(tokens[1]))
+                    streamer = VideoStreamer(server, tokens[1], fmt, target, encoders, delta=delta)
                 
-                    target = sender if "--target" not in tokens else tokens[tokens.index("--target") + 1]
-                    _tellraws(server, target, {
-                        "text": "鼠标悬停查看图片",
-                        "color": "yellow",
-                        "bold": True, "underlined": True,
-                        "hoverEvent": {
-                            "action": "show_text",
-                            "contents": raw
-                        }
-                    })
-                    
-                    time.sleep(max(0, ft - (time.time() - st)))
+                threading.Thread(target=_play_video, args=(server, sender, streamer), daemon=True).start()
+            
+            case "prerender-video":
+                size = (int(tokens[2]), int(tokens[3]))
+                fmt = FrameFormat(size, palette_size, max_bytes, overhead)
+                if palette_size or max_bytes:
+                    fmt.prepare(_sample_frames(tokens[1]))
+                
+                cache = VideoCache(tokens[1], size, palette_size, max_bytes)
+                threading.Thread(target=lambda: _tellraws(server, sender, {
+                    "text": f"预渲染完成: {cache.build(fmt)} 帧",
+                    "color": "green"
+                }), daemon=True).start()
+            
+            case "stop-video":
+                for streamer in streamers.copy():
+                    streamer.stopped.set()
     except Exception as e:
         _tellraws(server, sender, {"text": f"发生错误: {repr(e)}", "color": "red"})
 
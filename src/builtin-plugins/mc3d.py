@@ -1,15 +1,19 @@
 import json
 import typing
 import os
-from PIL import Image
+import hashlib
 import trimesh
 import numpy as np
 
+plugin_meta = {"lazy": True, "commands": ["mc3d"]}
+cache_dir: str
+
 def init(f: typing.Callable[[], dict[str, typing.Any]]):
-    global gvars
-    
+    global gvars, cache_dir
+
     gvars = f()
     gvars["plugin_commands"].append(gvars["PluginCommand"](startswith="mc3d", callback=main, need_async=True))
+    cache_dir = gvars["config"].get("mc3d_cache_dir", "./mc3d-cache")
 
     return {
         "name": "mc3d",
@@ -20,6 +24,13 @@ def init(f: typing.Callable[[], dict[str, typing.Any]]):
 def _tellraw(server, sender, raw):
     server.run_command(f"/tellraw {sender} {json.dumps(raw)}")
 
+def _file_hash(path: str):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
 def voxelize_model(mesh: trimesh.Trimesh, scale: float = 1.0, resolution: float = 64.0):
     bounds = mesh.bounds
     max_extent = max(bounds[1] - bounds[0])
@@ -27,46 +38,156 @@ def voxelize_model(mesh: trimesh.Trimesh, scale: float = 1.0, resolution: float
     voxels = mesh.voxelized(pitch=pitch / scale)
     return voxels, bounds, pitch
 
-def setblock(server, block: str, x: int, y: int, z: int):
-    server.run_command(f"/setblock {x} {y} {z} {block}")
+def exterior_shell(matrix: np.ndarray):
+    # 从包围盒外侧对空体素做洪水填充, 只保留与外部空气相邻的体素
+    filled = np.pad(matrix.astype(bool), 1)
+    empty = ~filled
+    outside = np.zeros_like(filled)
+    outside[0, :, :] = outside[-1, :, :] = True
+    outside[:, 0, :] = outside[:, -1, :] = True
+    outside[:, :, 0] = outside[:, :, -1] = True
+    outside &= empty
+
+    def dilate(m: np.ndarray):
+        d = m.copy()
+        d[1:, :, :] |= m[:-1, :, :]
+        d[:-1, :, :] |= m[1:, :, :]
+        d[:, 1:, :] |= m[:, :-1, :]
+        d[:, :-1, :] |= m[:, 1:, :]
+        d[:, :, 1:] |= m[:, :, :-1]
+        d[:, :, :-1] |= m[:, :, 1:]
+        return d
+
+    while True:
+        grown = dilate(outside) & empty
+        if np.array_equal(grown, outside): break
+        outside = grown
 
-def draw_model_in_minecraft(server, mesh: trimesh.Trimesh, texture: Image.Image, pos: tuple[int, int, int], scale: float = 1.0, resolution: float = 64.0):
+    return (filled & dilate(outside))[1:-1, 1:-1, 1:-1]
+
+def surface_uv(mesh: trimesh.Trimesh, centers: np.ndarray):
+    # 每个体素中心最近表面处的纹理坐标, 模型没有纹理坐标时为 None
+    uvs = getattr(mesh.visual, "uv", None)
+    if uvs is None or not len(centers): return None
+
+    _, _, face_idx = mesh.nearest.on_surface(centers)
+    return uvs[mesh.faces[face_idx]].mean(axis=1)
+
+def voxelize_mesh(mesh: trimesh.Trimesh, scale: float, resolution: float):
     voxels, bounds, pitch = voxelize_model(mesh, scale=scale, resolution=resolution)
-    matrix = voxels.matrix
-    offset = bounds[0]
-    
-    uvs = None
-    if hasattr(mesh.visual, "uv"):
-        uvs = mesh.visual.uv
-    
-    seted = set()
-    
-    for x, y, z in np.argwhere(matrix):
-        center = offset + np.array([x, y, z]) * pitch + pitch / 2
-        
-        if uvs is not None:
-            _, _, face_idx = mesh.nearest.on_surface([center])[0]
-            face = mesh.faces[face_idx]
-            uv = np.mean(uvs[face], axis=0)
-            u, v = uv[0], 1 - uv[1]
-            tex_x = int(u * texture.width)
-            tex_y = int(v * texture.height)
-            color = texture.getpixel((tex_x, tex_y))
-            block_id = gvars["getBlock_ByColor"](color)
-        else:
-            block_id = "minecraft:stone"
-        
-        mc_x = pos[0] + int(center[0] - offset[0])
-        mc_y = pos[1] + int(center[1] - offset[1])
-        mc_z = pos[2] + int(center[2] - offset[2])
-        
-        mcpos = (mc_x, mc_y, mc_z)
-        if mcpos in seted:
-            continue
-        seted.add(mcpos)
-        
-        print(f"Rendering block at {mc_x}, {mc_y}, {mc_z} with block id {block_id}")
-        setblock(server, block_id, mc_x, mc_y, mc_z)
+    matrix = np.asarray(voxels.matrix, dtype=bool)
+    centers = voxels.indices_to_points(np.argwhere(matrix))
+    return matrix, bounds[0], pitch, surface_uv(mesh, centers)
+
+def voxelize_file(model_path: str, scale: float, resolution: float):
+    # 供工作进程调用, 在进程内加载模型
+    return voxelize_mesh(trimesh.load(model_path), scale, resolution)
+
+def assign_blocks(uv: np.ndarray|None, tex: np.ndarray, count: int):
+    if uv is None or not count:
+        return ["minecraft:stone"], np.zeros(count, dtype=np.uint16)
+
+    height, width = tex.shape[:2]
+    tex_x = np.clip((uv[:, 0] * width).astype(int), 0, width - 1)
+    tex_y = np.clip(((1 - uv[:, 1]) * height).astype(int), 0, height - 1)
+    colors, color_idx = np.unique(tex[tex_y, tex_x], axis=0, return_inverse=True)
+
+    palette: list[str] = []
+    color_block = np.empty(len(colors), dtype=np.uint16)
+    for i, (r, g, b) in enumerate(colors.tolist()):
+        block_id = gvars["getBlock_ByColor"](r, g, b)
+        if block_id not in palette: palette.append(block_id)
+        color_block[i] = palette.index(block_id)
+
+    return palette, color_block[color_idx.reshape(-1)]
+
+def load_voxel_cache(key: str):
+    path = f"{cache_dir}/{key}.npz"
+    if not os.path.isfile(path): return None
+
+    with np.load(path) as data:
+        shape = tuple(data["shape"])
+        matrix = np.unpackbits(data["bits"], count=int(np.prod(shape))).reshape(shape).astype(bool)
+        return matrix, data["offset"], float(data["pitch"]), data["palette"].tolist(), data["blocks"]
+
+def save_voxel_cache(key: str, matrix: np.ndarray, offset: np.ndarray, pitch: float, palette: list[str], blocks: np.ndarray):
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_dir}/{key}.tmp.npz"
+    np.savez_compressed(
+        tmp_path,
+        shape = np.array(matrix.shape),
+        bits = np.packbits(matrix.ravel()),
+        offset = offset,
+        pitch = pitch,
+        palette = np.array(palette),
+        blocks = blocks
+    )
+    os.replace(tmp_path, f"{cache_dir}/{key}.npz")
+
+def _ibcd_hash():
+    # 方块颜色数据会被 reload-ibcd / test-ibcd 修改, 缓存的方块分配必须随之失效
+    return hashlib.sha256(json.dumps(gvars.get("ibcd_data", None), sort_keys=True).encode()).hexdigest()
+
+def build_voxel_data(model_path: str, texture_path: str, scale: float, resolution: float, use_cache: bool = True):
+    key = hashlib.sha256(f"{_file_hash(model_path)}:{_file_hash(texture_path)}:{_ibcd_hash()}:{scale!r}:{resolution!r}".encode()).hexdigest()
+
+    if use_cache and (cached := load_voxel_cache(key)) is not None:
+        return *cached, True
+
+    workers = gvars["plugin_workers"]
+    if workers.is_isolated(__file__):
+        matrix, offset, pitch, uv = workers.run(voxelize_file, model_path, scale, resolution).result()
+    else:
+        matrix, offset, pitch, uv = voxelize_mesh(gvars["asset_cache"].mesh(model_path), scale, resolution)
+
+    texture = gvars["asset_cache"].image(texture_path)
+    palette, blocks = assign_blocks(uv, texture, int(matrix.sum()))
+    save_voxel_cache(key, matrix, offset, pitch, palette, blocks)
+
+    return matrix, offset, pitch, palette, blocks, False
+
+def model_commands(
+    bridge, matrix: np.ndarray, pitch: float,
+    palette: list[str], blocks: np.ndarray,
+    pos: tuple[int, int, int], hollow: bool = False, batch: int = 4096
+):
+    # 在后台任务中执行 (隔离时在工作进程中): 提取外壳, 换算坐标, 按批提交 setblock 命令; 收到停止事件时提前结束
+    indices = np.argwhere(matrix)
+    if hollow:
+        keep = exterior_shell(matrix)[tuple(indices.T)]
+        indices, blocks = indices[keep], blocks[keep]
+
+    mcpos = (indices * pitch + pitch / 2).astype(int) + np.array(pos)
+    mcpos, first = np.unique(mcpos, axis=0, return_index=True)
+    blocks = blocks[first]
+
+    count = 0
+    for i in range(0, len(mcpos), batch):
+        if bridge.stopped(): break
+        bridge.run_commands([
+            f"setblock {x} {y} {z} {palette[b]}"
+            for (x, y, z), b in zip(mcpos[i:i + batch].tolist(), blocks[i:i + batch].tolist())
+        ])
+        count += min(batch, len(mcpos) - i)
+    return count
+
+jobs: list = []
+
+def draw_model_in_minecraft(
+    server, matrix: np.ndarray, pitch: float,
+    palette: list[str], blocks: np.ndarray,
+    pos: tuple[int, int, int], hollow: bool = False
+):
+    job = gvars["plugin_workers"].start(server, model_commands, matrix, pitch, palette, blocks, pos, hollow)
+    jobs.append(job)
+    try:
+        return job.result()
+    finally:
+        jobs.remove(job)
+
+def close():
+    # 卸载时停止还在发送命令的渲染任务
+    for job in jobs.copy(): job.stop()
 
 def main(server, sender: str, tokens: list[str]):
     def postresult(content, color):
@@ -74,22 +195,24 @@ def main(server, sender: str, tokens: list[str]):
             "text": content,
             "color": color
         })
-    
+
+    hollow = "--hollow" in tokens
+    use_cache = "--no-cache" not in tokens
+    tokens = [t for t in tokens if not t.startswith("--")]
+
     if len(tokens) < 3:
-        postresult("用法: mc3d <模型> <纹理> <x,y,z> [缩放=1.0] [分辨率=64.0]", "red")
+        postresult("用法: mc3d <模型> <纹理> <x,y,z> [缩放=1.0] [分辨率=64.0] [--hollow] [--no-cache]", "red")
         return
-    
+
     model_path = tokens[0]
     texture_path = tokens[1]
     pos = tuple(map(int, tokens[2].split(",")))
     scale = float(tokens[3]) if len(tokens) > 3 else 1.0
     resolution = float(tokens[4]) if len(tokens) > 4 else 64.0
-    
-    mesh = trimesh.load(model_path)
-    texture = Image.open(texture_path)
-    
-    draw_model_in_minecraft(server, mesh, texture, pos, scale, resolution)
-    postresult("模型已成功渲染", "green")
-
-def __getattr__(name: str) -> typing.Any: 
-    return globals().get(name, lambda *args, **kwargs: None)
\ No newline at end of file
+
+    matrix, _, pitch, palette, blocks, cached = build_voxel_data(model_path, texture_path, scale, resolution, use_cache)
+    count = draw_model_in_minecraft(server, matrix, pitch, palette, blocks, pos, hollow)
+    postresult(f"模型已成功渲染 ({count} 个方块{", 使用缓存" if cached else ""})", "green")
+
+def __getattr__(name: str) -> typing.Any:
+    return globals().get(name, lambda *args, **kwargs: None)
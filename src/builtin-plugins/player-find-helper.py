@@ -1,6 +1,10 @@
 import typing
 import json
 import re
+import os
+import time
+import threading
+import functools
 
 startswith = "pfh"
 
@@ -12,13 +16,126 @@ find-sw <name> - 查找以指定字符串开头的玩家
 find-ew <name> - 查找以指定字符串结尾的玩家
 find-in <name> - 查找包含指定字符串的玩家
 find-re <regular-expressions> - 使用正则表达式查找玩家
+
+默认在所有出现过的玩家中查找, 加 --online 只查找在线玩家
 \
 '''
 
+class _Trie:
+    # 每个节点保存经过它的全部名字, 前缀查询只需走完前缀
+    
+    def __init__(self):
+        self.root: dict = {"": set()}
+    
+    def add(self, key: str, value: str):
+        node = self.root
+        node[""].add(value)
+        for ch in key:
+            node = node.setdefault(ch, {"": set()})
+            node[""].add(value)
+    
+    def find(self, prefix: str) -> set[str]:
+        node = self.root
+        for ch in prefix:
+            if (node := node.get(ch)) is None: return set()
+        return node[""]
+
+class PlayerDirectory:
+    # 所有出现过的玩家及首次/最近出现时间, 以前缀树, 反向前缀树和 n-gram 索引支持查找
+    
+    GRAM = 3
+    
+    def __init__(self, path: str, delay: float = 5.0):
+        self.path = path
+        self.delay = delay
+        self.players: dict[str, list[float]] = {}
+        self._prefix = _Trie()
+        self._suffix = _Trie()
+        self._grams: dict[str, set[str]] = {}
+        self._lock = threading.RLock()
+        self._timer: threading.Timer|None = None
+        
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for name, seen in json.load(f).items():
+                    self._index(name, seen)
+    
+    def _index(self, name: str, seen: list[float]):
+        self.players[name] = seen
+        self._prefix.add(name, name)
+        self._suffix.add(name[::-1], name)
+        for n in range(1, self.GRAM + 1):
+            for i in range(len(name) - n + 1):
+                self._grams.setdefault(name[i:i + n], set()).add(name)
+    
+    def seen(self, names: typing.Iterable[str]):
+        names = list(names)
+        if not names: return
+        
+        now = time.time()
+        with self._lock:
+            for name in names:
+                if name in self.players:
+                    self.players[name][1] = now
+                else:
+                    self._index(name, [now, now])
+            self.schedule_save()
+    
+    def schedule_save(self):
+        # 日志线程上只标记需要保存, 短时间内的多次变化合并为一次写入
+        with self._lock:
+            if self._timer is not None: return
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def flush(self):
+        with self._lock:
+            if self._timer is not None: self._timer.cancel()
+            self._timer = None
+            
+            # 定时器与 close 可能同时写出, 写文件也在锁内完成
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(self.players, f, ensure_ascii=False)
+            os.replace(f"{self.path}.tmp", self.path)
+    
+    # 查询返回副本, 调用方在锁外遍历时不受日志线程的更新影响
+    
+    def startswith(self, prefix: str):
+        with self._lock:
+            return set(self._prefix.find(prefix))
+    
+    def endswith(self, suffix: str):
+        with self._lock:
+            return set(self._suffix.find(suffix[::-1]))
+    
+    def contains(self, part: str):
+        with self._lock:
+            if len(part) <= self.GRAM:
+                return set(self._grams.get(part, ())) if part else set(self.players)
+            
+            grams = sorted((self._grams.get(part[i:i + self.GRAM], set()) for i in range(len(part) - self.GRAM + 1)), key=len)
+            return {name for name in grams[0].intersection(*grams[1:]) if part in name}
+    
+    def search(self, pattern: str):
+        regex = _compile(pattern)
+        with self._lock:
+            names = list(self.players)
+        return {name for name in names if regex.search(name) is not None}
+
+@functools.lru_cache(maxsize=128)
+def _compile(pattern: str):
+    return re.compile(pattern)
+
 def init(f: typing.Callable[[], dict[str, typing.Any]]):
+    global directory, member_pattern, list_pattern
+    
     gvars = f()
     config = gvars["config"]
     pfh_admins = config.get("player_find_helper_admins", [])
+    directory = PlayerDirectory(config.get("player_find_helper_directory", "./pfh-players.json"))
+    member_pattern = gvars["PlayerRoster"].MEMBER_PATTERN
+    list_pattern = gvars["PlayerRoster"].LIST_PATTERN
     
     gvars["plugin_commands"].append(gvars["PluginCommand"](startswith=startswith, callback=main, allow_users=pfh_admins, need_async=True))
     
@@ -28,22 +145,42 @@ def init(f: typing.Callable[[], dict[str, typing.Any]]):
         "description": "Help Server Admin To Find Player."
     }
 
+def close():
+    # 卸载或重载前写出尚未保存的变化, 避免旧实例的定时器之后用旧数据覆盖文件
+    directory.flush()
+
+def loghooker(packer):
+    line: str = packer.obj
+    if line.endswith(" the game"):
+        if (m := member_pattern.match(line)) is not None:
+            directory.seen([m.group(1)])
+    elif "players online:" in line:
+        if (m := list_pattern.match(line)) is not None:
+            directory.seen([name for name in m.group(1).strip().split(", ") if name])
+
 def _tellraws(server, target: str, raw: dict):
     return server.run_command(f"tellraw {target} {json.dumps(raw, ensure_ascii=False)}")
 
 def main(server, sender: str, tokens: list[str]):
-    players: list[str] = server.get_players()
+    online = set(server.roster.snapshot())
+    directory.seen(online - directory.players.keys())
     
-    def postresult(result: list[str]):
+    def postresult(result: set[str]):
+        if "--online" in tokens: result = result & online
+        result = sorted(result, key=lambda x: (x not in online, x))
         _tellraws(server, sender, [
             {"text": f"找到 {len(result)} 名玩家:\n"},
             *[
                 {
-                    "text": f"{i + 1}. {x}",
+                    "text": f"{i + 1}. {x}{"" if x in online else " (离线)"}\n",
                     "insertion": x,
                     "hoverEvent": {
                         "action": "show_text",
-                        "contents": f"使用Shift+单击复制: {x}"
+                        "contents": "\n".join([
+                            f"使用Shift+单击复制: {x}",
+                            f"首次出现: {time.strftime("%Y-%m-%d %H:%M", time.localtime(directory.players[x][0]))}",
+                            f"最近出现: {time.strftime("%Y-%m-%d %H:%M", time.localtime(directory.players[x][1]))}"
+                        ])
                     }
                 }
                 for i, x in enumerate(result)
@@ -55,22 +192,18 @@ def main(server, sender: str, tokens: list[str]):
             _tellraws(server, sender, {"text": PFH_HELP})
         
         case "find-sw":
-            result = list(filter(lambda x: x.startswith(tokens[1]), players))
-            postresult(result)
+            postresult(directory.startswith(tokens[1]))
         
         case "find-ew":
-            result = list(filter(lambda x: x.endswith(tokens[1]), players))
-            postresult(result)
-
+            postresult(directory.endswith(tokens[1]))
+        
         case "find-in":
-            result = list(filter(lambda x: tokens[1] in x, players))
-            postresult(result)
+            postresult(directory.contains(tokens[1]))
         
         case "find-re":
-            result = list(filter(lambda x: re.search(tokens[1], x) is not None, players))
-            postresult(result)
-
+            postresult(directory.search(tokens[1]))
+        
         case _:
             _tellraws(server, sender, {"text": f"未知命令, 请使用 ~!{startswith} help 查看帮助信息"})
 
-def __getattr__(name: str) -> typing.Any: return globals().get(name, lambda *args, **kwargs: None)
\ No newline at end of file
+def __getattr__(name: str) -> typing.Any: return globals().get(name, lambda *args, **kwargs: None)
@@ -10,6 +10,7 @@ def init(f: typing.Callable[[], dict[str, typing.Any]]):
     gvars["plugin_commands"].append(gvars["PluginCommand"](startswith="run-cmd", callback=main, need_async=True))
     config = gvars["config"]
     admins = config.get("run_cmd_admins", [])
+    config.subscribe(["run_cmd_admins"], _on_config)
 
     return {
         "name": "run_cmd",
@@ -17,6 +18,13 @@ def init(f: typing.Callable[[], dict[str, typing.Any]]):
         "description": "Run command."
     }
 
+def _on_config(key: str, value: typing.Any):
+    global admins
+    admins = value or []
+
+def close():
+    gvars["config"].unsubscribe(_on_config)
+
 def _tellraw(server, sender, raw):
     server.run_command(f"/tellraw {sender} {json.dumps(raw)}")
 
@@ -1,20 +1,113 @@
+import re
 import json
 import typing
+import math
+import sqlite3
+import threading
 
-aliases: dict[str, dict[str, str]] = {}
-points: dict[str, dict[str, tuple[float, float, float]]] = {}
+GLOBAL_OWNER = "*"
+
+class TpStore:
+    # 别名与传送点的 SQLite 存储, 传送点按 CELL 大小的水平网格建索引, 用于半径与最近点查询
+    
+    CELL = 64
+    
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS aliases (
+                    owner TEXT NOT NULL, name TEXT NOT NULL, target TEXT NOT NULL,
+                    PRIMARY KEY (owner, name)
+                );
+                CREATE TABLE IF NOT EXISTS points (
+                    owner TEXT NOT NULL, name TEXT NOT NULL,
+                    x REAL NOT NULL, y REAL NOT NULL, z REAL NOT NULL,
+                    cx INTEGER NOT NULL, cz INTEGER NOT NULL,
+                    PRIMARY KEY (owner, name)
+                );
+                CREATE INDEX IF NOT EXISTS points_cell ON points (cx, cz);
+            """)
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
+    
+    def set_alias(self, owner: str, name: str, target: str):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO aliases VALUES (?, ?, ?)", (owner, name, target))
+    
+    def get_alias(self, owner: str, name: str) -> str|None:
+        with self._lock:
+            row = self._db.execute("SELECT target FROM aliases WHERE owner = ? AND name = ?", (owner, name)).fetchone()
+        return None if row is None else row[0]
+    
+    def set_point(self, owner: str, name: str, pos: tuple[float, float, float]):
+        x, y, z = pos
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO points VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (owner, name, x, y, z, math.floor(x / self.CELL), math.floor(z / self.CELL))
+            )
+    
+    def replace_points(self, owner: str, points: dict[str, tuple[float, float, float]]):
+        # 用 points 整体替换 owner 的全部传送点, 用于与配置同步的全局传送点
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM points WHERE owner = ?", (owner, ))
+            self._db.executemany(
+                "INSERT INTO points VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(owner, name, x, y, z, math.floor(x / self.CELL), math.floor(z / self.CELL)) for name, (x, y, z) in points.items()]
+            )
+    
+    def get_point(self, owner: str, name: str) -> tuple[float, float, float]|None:
+        with self._lock:
+            return self._db.execute("SELECT x, y, z FROM points WHERE owner = ? AND name = ?", (owner, name)).fetchone()
+    
+    def within(self, owner: str, pos: tuple[float, float, float], radius: float):
+        # 返回半径内 owner 与全局的传送点 [(距离, owner, name, (x, y, z))], 按距离排序
+        x, _, z = pos
+        cells = (
+            math.floor((x - radius) / self.CELL), math.floor((x + radius) / self.CELL),
+            math.floor((z - radius) / self.CELL), math.floor((z + radius) / self.CELL)
+        )
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT owner, name, x, y, z FROM points "
+                "WHERE cx BETWEEN ? AND ? AND cz BETWEEN ? AND ? AND owner IN (?, ?)",
+                (*cells, owner, GLOBAL_OWNER)
+            ).fetchall()
+        
+        result = [(math.dist(pos, p), o, n, p) for o, n, *p in rows]
+        return sorted(r for r in result if r[0] <= radius)
+    
+    def nearest(self, owner: str, pos: tuple[float, float, float], count: int = 1):
+        # 半径内的点一定比半径外的近, 以网格大小为起点倍增半径直到凑够 count 个
+        with self._lock:
+            total = self._db.execute("SELECT COUNT(*) FROM points WHERE owner IN (?, ?)", (owner, GLOBAL_OWNER)).fetchone()[0]
+        
+        radius = float(self.CELL)
+        while len(found := self.within(owner, pos, radius)) < min(count, total):
+            radius *= 2
+        return found[:count]
 
 def init(f: typing.Callable[[], dict[str, typing.Any]]):
     global global_alias
-    global global_points
+    global store, LogWaiterPromise, PlayerRoster
     
     gvars = f()
     gvars["plugin_commands"].append(gvars["PluginCommand"](startswith="tp", callback=main, need_async=True))
     gvars["plugin_commands"].append(gvars["PluginCommand"](startswith="tp-aa", callback=tp_addalias, need_async=True))
     gvars["plugin_commands"].append(gvars["PluginCommand"](startswith="tp-ap", callback=tp_addpoint, need_async=True))
+    gvars["plugin_commands"].append(gvars["PluginCommand"](startswith="tp-near", callback=tp_near, need_async=True))
     config = gvars["config"]
+    LogWaiterPromise = gvars["LogWaiterPromise"]
+    PlayerRoster = gvars["PlayerRoster"]
     global_alias = config.get("global_tp_alias", {})
-    global_points = config.get("global_tp_points", {})
+    
+    # 全局传送点以配置为准, 从配置中删除的点也从数据库中删除
+    store = TpStore(config.get("tp_store_path", "./tp-points.db"))
+    store.replace_points(GLOBAL_OWNER, {name: tuple(map(float, pos)) for name, pos in config.get("global_tp_points", {}).items()})
 
     return {
         "name": "tp",
@@ -28,9 +121,22 @@ def _tellraw(server, sender, raw):
 def _tellraw_all_player(server, raw):
     server.run_command(f"/tellraw @a {json.dumps(raw)}")
 
+def _get_position(server, player: str, timeout: float = 5.0) -> tuple[float, float, float]|None:
+    # 只接受服务器线程输出的完整玩家名, 聊天或名字以它结尾的玩家无法伪造; 玩家不在线时超时返回 None
+    pattern = re.compile(
+        PlayerRoster.LOG_PREFIX + re.escape(player) +
+        r" has the following entity data: \[" + ", ".join([r"(-?[\d.]+(?:E-?\d+)?)d"] * 3) + r"\]$"
+    )
+    pm = LogWaiterPromise(server, lambda line: pattern.match(line) is not None)
+    server.run_command(f"/data get entity {player} Pos")
+    try: line = pm.wait(timeout)
+    except TimeoutError: return None
+    return tuple(map(float, pattern.match(line).groups()))
+
+def close():
+    store.close()
+
 def main(server, sender: str, tokens: list[str]):
-    players: list[str] = server.get_players()
-    
     def postresult(content, color):
         _tellraw(server, sender, {
             "text": content,
@@ -41,18 +147,13 @@ def main(server, sender: str, tokens: list[str]):
         postresult("usage: tp <player> 传送到指定玩家位置", "red")
         return
 
-    if tokens[0] not in players:
-        a = aliases.get(sender, {})
-        p = points.get(sender, {})
-        
-        if tokens[0] in a:
-            tokens[0] = a[tokens[0]]
+    if tokens[0] not in server.roster:
+        if (target := store.get_alias(sender, tokens[0])) is not None:
+            tokens[0] = target
         elif tokens[0] in global_alias:
             tokens[0] = global_alias[tokens[0]]
-        elif tokens[0] in p:
-            tokens[0] = " ".join(map(str, p[tokens[0]]))
-        elif tokens[0] in global_points:
-            tokens[0] = " ".join(map(str, global_points[tokens[0]]))
+        elif (pos := store.get_point(sender, tokens[0]) or store.get_point(GLOBAL_OWNER, tokens[0])) is not None:
+            tokens[0] = " ".join(map(str, pos))
         else:
             postresult(f"没有找到玩家或传送点 {tokens[0]}", "red")
             return
@@ -73,10 +174,7 @@ def tp_addalias(server, sender: str, tokens: list[str]):
         postresult("usage: tp-aa <alias> <player> 添加别名", "red")
         return
     
-    if sender not in aliases:
-        aliases[sender] = {}
-        
-    aliases[sender][tokens[0]] = tokens[1]
+    store.set_alias(sender, tokens[0], tokens[1])
     postresult(f"添加别名 {tokens[0]} -> {tokens[1]}", "green")
 
 def tp_addpoint(server, sender: str, tokens: list[str]):
@@ -90,10 +188,31 @@ def tp_addpoint(server, sender: str, tokens: list[str]):
         postresult("usage: tp-ap <alias> <x> <y> <z> 添加传送点", "red")
         return
 
-    if sender not in points:
-        points[sender] = {}
-
-    points[sender][tokens[0]] = (float(tokens[1]), float(tokens[2]), float(tokens[3]))
+    store.set_point(sender, tokens[0], (float(tokens[1]), float(tokens[2]), float(tokens[3])))
     postresult(f"添加传送点 {tokens[0]} -> {tokens[1]},{tokens[2]},{tokens[3]}", "green")
 
+def tp_near(server, sender: str, tokens: list[str]):
+    if (pos := _get_position(server, sender)) is None:
+        _tellraw(server, sender, {"text": f"没有找到玩家 {sender}", "color": "red"})
+        return
+    
+    if tokens:
+        found = store.within(sender, pos, float(tokens[0]))
+        title = f"{tokens[0]} 格内的传送点"
+    else:
+        found = store.nearest(sender, pos, 5)
+        title = "最近的传送点"
+    
+    _tellraw(server, sender, [
+        {"text": f"{title} ({len(found)} 个):"},
+        *[
+            {
+                "text": f"\n{name}{" (全局)" if owner == GLOBAL_OWNER else ""} - {dist:.1f} 格",
+                "color": "green",
+                "clickEvent": {"action": "suggest_command", "value": f"~!tp {name}"}
+            }
+            for dist, owner, name, _ in found
+        ]
+    ])
+
 def __getattr__(name: str) -> typing.Any: return globals().get(name, lambda *args, **kwargs: None)
\ No newline at end of file
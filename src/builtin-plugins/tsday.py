@@ -4,12 +4,13 @@ import typing
 aliases: dict[str, dict[str, str]] = {}
 
 def init(f: typing.Callable[[], dict[str, typing.Any]]):
-    global tsday_admins
+    global tsday_admins, config
     
     gvars = f()
     gvars["plugin_commands"].append(gvars["PluginCommand"](startswith="tsday", callback=main, need_async=True))
     config = gvars["config"]
     tsday_admins = config.get("tsday_admins", [])
+    config.subscribe(["tsday_admins"], _on_config)
 
     return {
         "name": "tsday",
@@ -17,6 +18,13 @@ def init(f: typing.Callable[[], dict[str, typing.Any]]):
         "description": "Set time to day."
     }
 
+def _on_config(key: str, value: typing.Any):
+    global tsday_admins
+    tsday_admins = value or []
+
+def close():
+    config.unsubscribe(_on_config)
+
 def _tellraw(server, sender, raw):
     server.run_command(f"/tellraw {sender} {json.dumps(raw)}")
 
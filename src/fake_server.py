@@ -0,0 +1,196 @@
+import sys
+import time
+import random
+import socket
+import argparse
+import threading
+
+# 用于测试与基准测试的假 Minecraft 服务器:
+# 从标准输入读取命令, 在标准输出打印与原版格式相同的日志, 并在本地提供 RCON
+#
+# 支持的命令:
+# list / say <msg> / data get entity <player> Pos / function <id> / tick query / stop
+# fake-burst <n> - 立即输出 n 行聊天日志, 最后输出 "fake-burst-done <n>"
+# fake-join <player> / fake-leave <player>
+
+class FakeServer:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.players: list[str] = [f"Player{i}" for i in range(args.players)]
+        self.running = True
+        self._out_lock = threading.Lock()
+        self._rng = random.Random(args.seed)
+
+    def log(self, message: str, thread: str = "Server thread", level: str = "INFO"):
+        line = f"[{time.strftime("%H:%M:%S")}] [{thread}/{level}]: {message}\n"
+        with self._out_lock:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+
+    def latency(self):
+        if self.args.latency_ms > 0:
+            time.sleep(self.args.latency_ms / 1000 * (0.5 + self._rng.random()))
+
+    def chat_line(self):
+        player = self._rng.choice(self.players) if self.players else "Player0"
+        words = self._rng.choices(["hello", "tp", "home", "gg", "find-sw", "lol", "brb"], k=self._rng.randint(1, 6))
+        return f"<{player}> {" ".join(words)}"
+
+    def execute(self, command: str) -> str:
+        # 执行一条命令, 返回 RCON 回复文本; 需要写日志的命令同时写日志
+        command = command.strip().lstrip("/")
+        name, _, rest = command.partition(" ")
+
+        match name:
+            case "list":
+                reply = f"There are {len(self.players)} of a max of {self.args.max_players} players online: {", ".join(self.players)}"
+            case "say":
+                reply = f"[Server] {rest}"
+            case "data" if rest.startswith("get entity ") and rest.endswith(" Pos"):
+                player = rest[len("get entity "):-len(" Pos")]
+                reply = f"{player} has the following entity data: [{self._rng.uniform(-500, 500):.3f}d, 64.0d, {self._rng.uniform(-500, 500):.3f}d]"
+            case "tick" if rest == "query":
+                mspt = self._rng.uniform(5, 60)
+                reply = f"The game is running normally\nTarget tick rate: 20.0 per second.\nAverage time per tick: {mspt:.1f}ms (Target: 50.0ms)"
+            case "function":
+                reply = f"Executed {self._rng.randint(1, 5000)} commands from function '{rest}'"
+            case "fake-burst":
+                count = int(rest or 1)
+                for _ in range(count): self.log(self.chat_line())
+                reply = f"fake-burst-done {count}"
+            case "fake-join":
+                self.players.append(rest)
+                reply = f"{rest} joined the game"
+            case "fake-leave":
+                if rest in self.players: self.players.remove(rest)
+                reply = f"{rest} left the game"
+            case "stop":
+                self.running = False
+                reply = "Stopping the server"
+            case _:
+                return ""
+
+        self.log(reply)
+        return reply
+
+    def run_stdin(self):
+        for line in sys.stdin:
+            if not line.strip(): continue
+            self.latency()
+            self.execute(line)
+            if not self.running: break
+        self.running = False
+
+    def run_traffic(self):
+        # 按 log_rate 持续产生聊天与进出服务器日志, 偶尔夹杂卡顿警告与 GC 日志
+        if self.args.log_rate <= 0: return
+        interval = 1 / self.args.log_rate
+        next_time = time.perf_counter()
+
+        while self.running:
+            roll = self._rng.random()
+            if roll < 0.002:
+                behind = self._rng.randint(2001, 6000)
+                self.log(f"Can't keep up! Is the server overloaded? Running {behind}ms or {behind // 50} ticks behind", level="WARN")
+            elif roll < 0.01:
+                with self._out_lock:
+                    sys.stdout.write(f"[{time.perf_counter():.3f}s][info][gc] GC(0) Pause Young (Normal) (G1 Evacuation Pause) 180M->40M(512M) {self._rng.uniform(1, 30):.3f}ms\n")
+                    sys.stdout.flush()
+            elif roll < 0.02:
+                name = f"Guest{self._rng.randint(0, 9999)}"
+                self.players.append(name)
+                self.log(f"{name} joined the game")
+            elif roll < 0.04 and len(self.players) > self.args.players:
+                name = self.players.pop(self._rng.randrange(self.args.players, len(self.players)))
+                self.log(f"{name} left the game")
+            else:
+                self.log(self.chat_line())
+
+            next_time += interval
+            time.sleep(max(0.0, next_time - time.perf_counter()))
+
+    def _send_packet(self, conn: socket.socket, reqid: int, packet_type: int, body: str):
+        payload = reqid.to_bytes(4, "little", signed=True) + packet_type.to_bytes(4, "little") + body.encode() + b"\x00\x00"
+        packet = len(payload).to_bytes(4, "little") + payload
+
+        if not self.args.fragment:
+            conn.sendall(packet)
+            return
+
+        # 把回复拆成随机大小的片段发送, 模拟网络分片
+        pos = 0
+        while pos < len(packet):
+            size = self._rng.randint(1, 16)
+            conn.sendall(packet[pos:pos + size])
+            pos += size
+            time.sleep(0.0005)
+
+    def _recv_exact(self, conn: socket.socket, size: int):
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk: raise ConnectionError("rcon client closed")
+            data += chunk
+        return data
+
+    def _serve_rcon_client(self, conn: socket.socket):
+        authed = False
+        with conn:
+            try:
+                while self.running:
+                    size = int.from_bytes(self._recv_exact(conn, 4), "little")
+                    packet = self._recv_exact(conn, size)
+                    reqid = int.from_bytes(packet[:4], "little", signed=True)
+                    packet_type = int.from_bytes(packet[4:8], "little")
+                    body = packet[8:-2].decode()
+
+                    if packet_type == 3:
+                        authed = body == self.args.password
+                        self._send_packet(conn, reqid if authed else -1, 2, "")
+                    elif packet_type == 2 and authed:
+                        self.latency()
+                        # 与真实服务器一致: 整个包体是一条命令, 不按换行拆分
+                        self._send_packet(conn, reqid, 0, self.execute(body))
+            except (ConnectionError, OSError):
+                pass
+
+    def run_rcon(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", self.args.rcon_port))
+        sock.listen()
+        self.log(f"RCON running on 127.0.0.1:{sock.getsockname()[1]}", "RCON Listener #1")
+
+        while self.running:
+            conn, _ = sock.accept()
+            threading.Thread(target=self._serve_rcon_client, args=(conn, ), daemon=True).start()
+
+    def run(self):
+        start = time.perf_counter()
+        self.log(f"Starting minecraft server version {self.args.version}")
+        time.sleep(self.args.boot_ms / 1000)
+
+        if self.args.rcon_port is not None:
+            threading.Thread(target=self.run_rcon, daemon=True).start()
+
+        self.log(f"Done ({time.perf_counter() - start:.3f}s)! For help, type \"help\"")
+        threading.Thread(target=self.run_traffic, daemon=True).start()
+        self.run_stdin()
+
+def parse_args(argv: list[str]|None = None):
+    parser = argparse.ArgumentParser(description="Fake Minecraft server for controller benchmarks.")
+    parser.add_argument("--rcon-port", type=int, default=None, help="listen for RCON on this port (0 picks a free port)")
+    parser.add_argument("--password", default="test", help="RCON password")
+    parser.add_argument("--players", type=int, default=3, help="players online at start")
+    parser.add_argument("--max-players", type=int, default=20)
+    parser.add_argument("--log-rate", type=float, default=0.0, help="background chat/join/leave lines per second")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="average simulated latency per command")
+    parser.add_argument("--fragment", action="store_true", help="split RCON replies into small fragments")
+    parser.add_argument("--boot-ms", type=float, default=0.0, help="simulated boot time")
+    parser.add_argument("--version", default="1.20.1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("extra", nargs="*", help="ignored server arguments such as nogui")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    FakeServer(parse_args()).run()
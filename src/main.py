@@ -9,17 +9,28 @@ import time
 import logging
 import shutil
 import json
-from os import mkdir, remove
+import hashlib
+import re
+import pickle
+import shlex
+import queue
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import Manager, resource_tracker, shared_memory
+from os import getpid, name as os_name, listdir, makedirs, mkdir, remove, rename, replace, stat
 from os.path import abspath, dirname, exists, isfile, isdir
-from random import randint
+from random import randint, random
+
+try: from os import sysconf
+except ImportError: sysconf = None
 
 logging.basicConfig(
     level = logging.INFO,
     format = "[%(asctime)s] %(levelname)s %(filename)s %(funcName)s: %(message)s",
     datefmt = "%H:%M:%S"
 )
-    
-rcon_promises: list[Promise] = []
 
 class RCON_PACKET_TYPE:
     SERVERDATA_AUTH = 3
@@ -32,13 +43,15 @@ class Promise:
         self._e = threading.Event()
         self._v = None
         self.rid = rid
+        self.created = time.perf_counter()
+        self.traced = tracer.sampled()
     
     def resolve(self, value):
         self._v = value
         self._e.set()
     
-    def wait(self):
-        self._e.wait()
+    def wait(self, timeout: float|None = None):
+        if not self._e.wait(timeout): raise TimeoutError(f"no reply to request {self.rid} in {timeout}s")
         return self._v
 
 class LogWaiterPromise:
@@ -50,13 +63,257 @@ class LogWaiterPromise:
         server.log_waiter_promises.append(self)
     
     def resolve(self, line: str):
-        self._e.set()
         self._v = line
+        self._e.set()
     
-    def wait(self):
-        self._e.wait()
+    def wait(self, timeout: float|None = None):
+        if not self._e.wait(timeout):
+            try: self.server.log_waiter_promises.remove(self)
+            except ValueError: pass
+            raise TimeoutError(f"no matching log line in {timeout}s")
         return self._v
 
+class PlayerRoster:
+    # 在线玩家名单: 启动时以一次 list 为准, 之后由进出服务器的日志增量维护, 并定期用 list 校正
+    # 只匹配服务器线程自己输出的行 (原版 "[时间] [Server thread/INFO]: " 或 Bukkit "[时间 INFO]: "), 玩家聊天无法伪造
+    
+    LOG_PREFIX = r"^(?:\[[^\]]*\] \[Server thread/INFO\](?: \[[^\]]*\])?|\[\d{1,2}:\d{2}:\d{2} INFO\]): "
+    MEMBER_PATTERN = re.compile(LOG_PREFIX + r"([^\s<>]+) (joined|left) the game$")
+    LIST_PATTERN = re.compile(LOG_PREFIX + r"There are \d+ of a max of \d+ players online:(.*)$")
+    
+    def __init__(self, server: MinecraftServer, reconcile_interval: float = 60.0, timeout: float = 5.0):
+        self.server = server
+        self.reconcile_interval = reconcile_interval
+        self.timeout = timeout
+        self.synced_at = 0.0
+        self._players: dict[str, None] = {}
+        self._snapshot: tuple[str, ...] = ()
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+    
+    def observe(self, line: str):
+        if line.endswith(" the game"):
+            if (m := self.MEMBER_PATTERN.match(line)) is None: return
+            
+            with self._lock:
+                if m.group(2) == "joined": self._players[m.group(1)] = None
+                else: self._players.pop(m.group(1), None)
+                self._snapshot = tuple(self._players)
+        
+        elif "players online:" in line:
+            if (m := self.LIST_PATTERN.match(line)) is not None:
+                self._sync(m.group(1))
+    
+    def _sync(self, names: str):
+        with self._lock:
+            self._players = dict.fromkeys(name for name in names.strip().split(", ") if name)
+            self._snapshot = tuple(self._players)
+            self.synced_at = time.time()
+        self._ready.set()
+    
+    def refresh(self, urcon: bool = False):
+        # 发送 list 并等待名单同步; 超时 (例如日志格式无法识别) 时沿用当前已知的名单
+        self._ready.clear()
+        pm = self.server.run_command("list", False, urcon)
+        
+        try:
+            if pm is not None:
+                self._sync("".join(pm.wait(self.timeout)[2].split("players online:")[1:]))
+            elif not self._ready.wait(self.timeout):
+                raise TimeoutError(f"no list output in {self.timeout}s")
+        except TimeoutError as e:
+            logging.warning(f"roster refresh failed, using last known players: {e}")
+            self._ready.set()
+    
+    def _ensure_ready(self, urcon: bool = False):
+        if not self._ready.is_set(): self.refresh(urcon)
+    
+    def snapshot(self, urcon: bool = False):
+        self._ensure_ready(urcon)
+        return self._snapshot
+    
+    def __contains__(self, name: str):
+        self._ensure_ready()
+        return name in self._players
+    
+    def __len__(self):
+        self._ensure_ready()
+        return len(self._players)
+    
+    def reset(self):
+        with self._lock:
+            self._players = {}
+            self._snapshot = ()
+        self._ready.clear()
+    
+    def _reconcile(self):
+        while self.server._spopen is not None and self.server._spopen.poll() is None:
+            time.sleep(self.reconcile_interval)
+            if time.time() - self.synced_at < self.reconcile_interval: continue
+            
+            try: self.server.run_command("list")
+            except Exception as e: logging.error(f"error in roster reconcile: {repr(e)}")
+
+class ServerHealth:
+    # 服务器负载采样: 进程 RSS 与 CPU 取自 /proc, MSPT/TPS 经 RCON 查询, 卡顿与 GC 停顿取自日志
+    # 每个采样周期一条记录, 保存在定长环形缓冲中, 查询不需要向服务器发送命令
+    
+    FIELDS = ("time", "rss", "cpu", "heap_used", "heap_total", "mspt", "tps", "lag_ms", "gc_pause_ms")
+    
+    # (命令, 正则, 字段): 依次尝试, 使用第一个能解析出结果的命令
+    PERF_QUERIES = (
+        ("tick query", re.compile(r"Average time per tick: ([\d.]+) ?ms"), "mspt"),
+        ("mspt", re.compile(r"([\d.]+)/[\d.]+/[\d.]+"), "mspt"),
+        ("tps", re.compile(r"TPS from last 1m, 5m, 15m: \*?([\d.]+)"), "tps"),
+        ("forge tps", re.compile(r"Overall: Mean tick time: ([\d.]+) ms"), "mspt")
+    )
+    # 与 PlayerRoster 一样锚定在行首, 玩家聊天无法伪造卡顿或 GC 记录
+    # 卡顿警告由服务器线程以 WARN 级别输出 (原版与 Bukkit 两种前缀)
+    LAG_PATTERN = re.compile(
+        r"^(?:\[[^\]]*\] \[Server thread/WARN\](?: \[[^\]]*\])?|\[\d{1,2}:\d{2}:\d{2} WARN\]): "
+        r"Can't keep up! .*?Running (\d+)ms or (\d+) ticks behind"
+    )
+    # GC 日志由 JVM 直接输出: -Xlog:gc 的 "[装饰][info][gc] " 前缀, 与旧版 -verbose:gc 可选的 "时间戳: " 前缀
+    GC_PATTERN = re.compile(r"^(?:\[[^\]]*\])*\[info\]\[gc[^\]]*\] GC\(\d+\) Pause .*?(?:(\d+)M->(\d+)M\((\d+)M\) )?([\d.]+)ms$")
+    LEGACY_GC_PATTERN = re.compile(r"^(?:[\w\-:.+]+: )*\[(?:Full )?GC .*?(?:(\d+)K->(\d+)K\((\d+)K\)), ([\d.]+) secs\]")
+    
+    def __init__(self, server: MinecraftServer, interval: float = 5.0, history: int = 720, perf_command: str|None = None, timeout: float = 5.0):
+        self.server = server
+        self.interval = interval
+        self.perf_command = perf_command
+        self.timeout = timeout
+        self.samples: deque[tuple[float, ...]] = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self._lag_ms = 0.0
+            self._gc_pause_ms = 0.0
+            self._heap = (float("nan"), float("nan"))
+        self._cpu_last: tuple[float, float]|None = None
+        self._perf: tuple[str, re.Pattern, str]|None = None
+        self._perf_probed = False
+    
+    def set_history(self, history: int):
+        with self._lock:
+            self.samples = deque(self.samples, maxlen=history)
+    
+    def observe(self, line: str):
+        if "Can't keep up!" in line:
+            if (m := self.LAG_PATTERN.match(line)) is None: return
+            with self._lock: self._lag_ms += int(m.group(1))
+            metrics.inc("mscr_server_lag_warnings_total", server=self.server.name)
+        
+        elif "GC" in line and ("Pause" in line or "secs]" in line):
+            if (m := self.GC_PATTERN.match(line)) is not None:
+                unit, pause = 1 << 20, float(m.group(4))
+            elif (m := self.LEGACY_GC_PATTERN.match(line)) is not None:
+                unit, pause = 1 << 10, float(m.group(4)) * 1000
+            else:
+                return
+            
+            with self._lock:
+                self._gc_pause_ms += pause
+                if m.group(2) is not None: self._heap = (int(m.group(2)) * unit, int(m.group(3)) * unit)
+            metrics.observe("mscr_server_gc_pause_seconds", pause / 1000, server=self.server.name)
+    
+    def _read_proc(self, pid: int):
+        # 返回 (RSS 字节, CPU 占用百分比); 没有 /proc 的系统上为 nan
+        nan = float("nan")
+        if sysconf is None: return nan, nan
+        
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                fields = f.read().rsplit(b")", 1)[1].split()
+        except OSError:
+            return nan, nan
+        
+        now = time.perf_counter()
+        cpu_time = (int(fields[11]) + int(fields[12])) / sysconf("SC_CLK_TCK")
+        rss = int(fields[21]) * sysconf("SC_PAGE_SIZE")
+        
+        last, self._cpu_last = self._cpu_last, (now, cpu_time)
+        if last is None or now <= last[0]: return rss, nan
+        return rss, (cpu_time - last[1]) / (now - last[0]) * 100
+    
+    def _query_perf(self):
+        # 返回 (mspt, tps); 没有 RCON 或服务器不支持任何查询命令时为 nan
+        nan = float("nan")
+        if self.server._rcon is None or self.perf_command == "": return nan, nan
+        
+        if self._perf is None:
+            if self._perf_probed: return nan, nan
+            self._perf_probed = True
+            queries = [q for q in self.PERF_QUERIES if self.perf_command in (None, q[0])]
+        else:
+            queries = [self._perf]
+        
+        for query in queries:
+            command, pattern, field = query
+            try:
+                reply = self.server.run_command(command, urcon=True).wait(self.timeout)[2]
+            except TimeoutError:
+                # 超时不代表服务器不支持该命令, 下次采样重新探测
+                if self._perf is None: self._perf_probed = False
+                logging.warning(f"health query \"{command}\" timed out after {self.timeout}s.")
+                return nan, nan
+            if (m := pattern.search(re.sub("§.", "", reply))) is None: continue
+            
+            self._perf = query
+            value = float(m.group(1))
+            if field == "tps": return (1000 / value if value > 0 else nan), value
+            return value, min(20.0, 1000 / value) if value > 0 else 20.0
+        
+        return nan, nan
+    
+    def sample(self):
+        spopen = self.server._spopen
+        if spopen is None: return
+        
+        rss, cpu = self._read_proc(spopen.pid)
+        mspt, tps = self._query_perf()
+        with self._lock:
+            record = (time.time(), rss, cpu, *self._heap, mspt, tps, self._lag_ms, self._gc_pause_ms)
+            self._lag_ms = self._gc_pause_ms = 0.0
+            self.samples.append(record)
+        return record
+    
+    def _run(self):
+        while self.server._spopen is not None and self.server._spopen.poll() is None:
+            try: self.sample()
+            except Exception as e: logging.error(f"error in health sample: {repr(e)}")
+            time.sleep(self.interval)
+    
+    def latest(self):
+        return dict(zip(self.FIELDS, self.samples[-1])) if self.samples else None
+    
+    def value(self, field: str):
+        return self.samples[-1][self.FIELDS.index(field)] if self.samples else float("nan")
+    
+    def recent(self, seconds: float):
+        since = time.time() - seconds
+        with self._lock:
+            return [dict(zip(self.FIELDS, s)) for s in self.samples if s[0] >= since]
+    
+    def summary(self, seconds: float = 60.0):
+        # 最近 seconds 秒的平均值与最大值, lag_ms 与 gc_pause_ms 为总和; 忽略缺失的 nan
+        samples = self.recent(seconds)
+        result: dict[str, float] = {"samples": len(samples)}
+        for field in self.FIELDS[1:]:
+            values = [s[field] for s in samples if s[field] == s[field]]
+            if field in ("lag_ms", "gc_pause_ms"):
+                result[field] = sum(values)
+            elif values:
+                result[field] = sum(values) / len(values)
+                result[f"{field}_max"] = max(values)
+        return result
+    
+    def busy(self, seconds: float = 15.0, mspt: float = 45.0):
+        # 调度用: 最近有卡顿警告, 或平均 MSPT 超过阈值
+        summary = self.summary(seconds)
+        return summary.get("lag_ms", 0) > 0 or summary.get("mspt", 0) > mspt
+
 class CmdRunner:
     def __init__(self, server: MinecraftServer):
         self.server = server
@@ -194,26 +451,189 @@ class CmdRunner:
     
     def data_remove(self, path: str):
         return self.run(f"data remove {path}")
+
+class LaunchProfile:
+    # 服务器 JVM 启动配置: 堆大小, GC 及其参数, 预分配内存, 类数据共享 (AppCDS) 存档
+    # cds: False 不使用; "auto" 由 JDK 19+ 自动创建并复用存档; "dynamic" 首次退出时写入存档, 之后复用
+    
+    OPTIONS = ("java", "min_mem", "max_mem", "gc", "gc_flags", "pre_touch", "cds", "gc_log", "nogui", "jvm_args", "server_args")
+    GC_PRESETS = {
+        "g1": ["-XX:+UseG1GC"],
+        "g1-aikar": [
+            "-XX:+UseG1GC", "-XX:+ParallelRefProcEnabled", "-XX:MaxGCPauseMillis=200",
+            "-XX:+UnlockExperimentalVMOptions", "-XX:+DisableExplicitGC",
+            "-XX:G1NewSizePercent=30", "-XX:G1MaxNewSizePercent=40", "-XX:G1HeapRegionSize=8M",
+            "-XX:G1ReservePercent=20", "-XX:G1HeapWastePercent=5", "-XX:G1MixedGCCountTarget=4",
+            "-XX:InitiatingHeapOccupancyPercent=15", "-XX:G1MixedGCLiveThresholdPercent=90",
+            "-XX:G1RSetUpdatingPauseTimePercent=5", "-XX:SurvivorRatio=32",
+            "-XX:+PerfDisableSharedMem", "-XX:MaxTenuringThreshold=1"
+        ],
+        "zgc": ["-XX:+UseZGC"],
+        "zgc-generational": ["-XX:+UseZGC", "-XX:+ZGenerational"],
+        "shenandoah": ["-XX:+UseShenandoahGC"],
+        "parallel": ["-XX:+UseParallelGC"],
+        "serial": ["-XX:+UseSerialGC"]
+    }
     
+    def __init__(
+        self,
+        name: str = "default",
+        java: str = "java",
+        min_mem: str|None = None,
+        max_mem: str = "768M",
+        gc: str|None = None,
+        gc_flags: typing.Iterable[str] = (),
+        pre_touch: bool = False,
+        cds: typing.Literal[False, "auto", "dynamic"] = False,
+        gc_log: bool = False,
+        nogui: bool = True,
+        jvm_args: typing.Iterable[str] = (),
+        server_args: typing.Iterable[str] = ()
+    ):
+        if gc is not None and gc not in self.GC_PRESETS:
+            raise ValueError(f"unknown gc {gc!r}, expected one of {", ".join(self.GC_PRESETS)}")
+        if cds not in (False, "auto", "dynamic"):
+            raise ValueError(f"unknown cds mode {cds!r}, expected false, \"auto\" or \"dynamic\"")
+        
+        self.name = name
+        self.java = java
+        self.min_mem = min_mem
+        self.max_mem = max_mem
+        self.gc = gc
+        self.gc_flags = list(gc_flags)
+        self.pre_touch = pre_touch
+        self.cds = cds
+        self.gc_log = gc_log
+        self.nogui = nogui
+        self.jvm_args = list(jvm_args)
+        self.server_args = list(server_args)
+    
+    @classmethod
+    def from_config(cls, name: str, data: dict[str, typing.Any]):
+        if unknown := set(data) - set(cls.OPTIONS):
+            raise ValueError(f"unknown options in launch profile {name}: {", ".join(sorted(unknown))}")
+        return cls(name, **data)
+    
+    def cds_archive(self, server_path: str, rundir: str):
+        # 存档随服务端 jar 与 java 变化失效, 文件名带上它们的摘要
+        try: st = stat(server_path)
+        except OSError: return None
+        
+        key = hashlib.md5(f"{self.java}|{abspath(server_path)}|{st.st_size}|{st.st_mtime_ns}".encode()).hexdigest()[:12]
+        return f"{rundir}/.mscr-cds/{re.sub(r"[^\w.-]", "_", self.name)}-{key}.jsa"
+    
+    def cds_state(self, server_path: str, rundir: str):
+        if not self.cds or (archive := self.cds_archive(server_path, rundir)) is None: return None
+        return "reuse" if isfile(archive) else "create"
+    
+    def prepare(self, server_path: str, rundir: str):
+        # 启动前的文件准备: 创建存档目录, 删除本配置已失效的旧存档; command() 本身不修改文件
+        if not self.cds or (archive := self.cds_archive(server_path, rundir)) is None: return
+        if isfile(archive): return
+        
+        makedirs(dirname(archive), exist_ok=True)
+        prefix = archive.rsplit("-", 1)[0]
+        for old in listdir(dirname(archive)):
+            if f"{dirname(archive)}/{old}".rsplit("-", 1)[0] == prefix: remove(f"{dirname(archive)}/{old}")
+    
+    def _cds_args(self, server_path: str, rundir: str):
+        if not self.cds or (archive := self.cds_archive(server_path, rundir)) is None: return []
+        
+        if self.cds == "auto":
+            return ["-XX:+AutoCreateSharedArchive", f"-XX:SharedArchiveFile={archive}"]
+        if isfile(archive):
+            return [f"-XX:SharedArchiveFile={archive}"]
+        return [f"-XX:ArchiveClassesAtExit={archive}"]
+    
+    def command(self, server_path: str, rundir: str, args: typing.Iterable[str] = (), max_mem: str|None = None):
+        return [
+            self.java,
+            *([f"-Xms{self.min_mem}"] if self.min_mem else []),
+            f"-Xmx{max_mem or self.max_mem}",
+            *(self.GC_PRESETS[self.gc] if self.gc else []),
+            *self.gc_flags,
+            *(["-XX:+AlwaysPreTouch"] if self.pre_touch else []),
+            *(["-Xlog:gc"] if self.gc_log else []),
+            *self._cds_args(server_path, rundir),
+            *self.jvm_args,
+            "-jar", server_path,
+            *(["nogui"] if self.nogui else []),
+            *self.server_args,
+            *args
+        ]
+
+class BootLog:
+    # 每个启动配置最近 keep 次的启动耗时, 保存在服务器目录下, 用于比较不同配置的启动速度
+    
+    def __init__(self, path: str, keep: int = 20):
+        self.path = path
+        self.keep = keep
+        self.data: dict[str, list[dict[str, typing.Any]]] = {}
+        
+        if isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except Exception as e:
+                logging.error(f"error in loading boot log: {repr(e)}")
+    
+    def record(self, profile: str, seconds: float, server_seconds: float|None, cds: str|None):
+        entries = self.data.setdefault(profile, [])
+        entries.append({"time": time.time(), "seconds": round(seconds, 3), "server_seconds": server_seconds, "cds": cds})
+        del entries[:-self.keep]
+        
+        try:
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=4)
+            replace(f"{self.path}.tmp", self.path)
+        except Exception as e:
+            logging.error(f"error in saving boot log: {repr(e)}")
+    
+    def report(self):
+        lines = []
+        for profile, entries in sorted(self.data.items()):
+            times = [e["seconds"] for e in entries]
+            lines.append(f"{profile}: n={len(times)} last={times[-1]:.2f}s avg={sum(times) / len(times):.2f}s min={min(times):.2f}s")
+            for state in ("create", "reuse"):
+                if cds_times := [e["seconds"] for e in entries if e["cds"] == state]:
+                    lines.append(f"    cds {state}: n={len(cds_times)} avg={sum(cds_times) / len(cds_times):.2f}s")
+        return "\n".join(lines) or "no boot recorded."
+
 class MinecraftServer:
     def __init__(
         self,
         server_path: str,
         server_rundir: str = None,
-        loghooker: typing.Callable[[str], typing.Any] = lambda x: x
+        loghooker: typing.Callable[[str], typing.Any] = lambda x: x,
+        name: str = "default"
     ):
+        self.name = name
         self.server_path = server_path
         self.server_rundir = server_rundir if server_rundir is not None else dirname(abspath(self.server_path))
         self.loghooker = loghooker
         self.waiting_commands: list[str] = []
         self.log_waiter_promises: list[LogWaiterPromise] = []
         self.cmd_runner = CmdRunner(self)
+        self.roster = PlayerRoster(self)
+        self.health = ServerHealth(self)
+        self.profile = LaunchProfile()
+        self.boot_log = BootLog(f"{self.server_rundir}/mscr_boot_times.json")
         
         self._spopen = None
+        self._booting: tuple[float, str, str|None]|None = None
         self._rcon = None
         self._rcon_logindata = None
+        self._rcon_lock = threading.Lock()
+        self._rcon_auth_rid: int|None = None
+        self.rcon_promises: dict[int, Promise] = {}
+        
+        metrics.gauge("mscr_rcon_inflight", lambda: len(self.rcon_promises), server=name)
+        metrics.gauge("mscr_waiting_commands", lambda: len(self.waiting_commands), server=name)
+        metrics.gauge("mscr_log_waiters", lambda: len(self.log_waiter_promises), server=name)
+        for metric, field in (("rss_bytes", "rss"), ("cpu_percent", "cpu"), ("heap_used_bytes", "heap_used"), ("mspt", "mspt"), ("tps", "tps")):
+            metrics.gauge(f"mscr_server_{metric}", lambda field=field: self.health.value(field), server=name)
     
-    def start(self, args: typing.Iterable[str] = (), max_mem: str = "768M"):
+    def start(self, args: typing.Iterable[str] = (), max_mem: str|None = None):
         if self._spopen is not None:
             raise Exception("Server is already running")
         
@@ -246,18 +666,34 @@ class MinecraftServer:
         self.datapack_funcspath = f"{datapackpath}/data/minecraftservercontroler/functions"
         mkdir(self.datapack_funcspath)
         
-        self._spopen = subprocess.Popen([
-                "java", f"-Xmx{max_mem}", "-jar",
-                self.server_path,
-                *args
-            ], 
+        self.profile.prepare(self.server_path, self.server_rundir)
+        self._booting = (time.perf_counter(), self.profile.name, self.profile.cds_state(self.server_path, self.server_rundir))
+        self._spopen = subprocess.Popen(
+            self.launch_command(args, max_mem),
             stdin = subprocess.PIPE,
             stdout = subprocess.PIPE,
             cwd = self.server_rundir,
-            creationflags = subprocess.CREATE_NEW_PROCESS_GROUP
+            creationflags = getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0)
         )
         
+        self.roster.reset()
+        self.health.reset()
         threading.Thread(target=self._outputlogs, daemon=True).start()
+        threading.Thread(target=self.roster._reconcile, daemon=True).start()
+        threading.Thread(target=self.health._run, daemon=True).start()
+    
+    def launch_command(self, args: typing.Iterable[str], max_mem: str|None):
+        return self.profile.command(self.server_path, self.server_rundir, args, max_mem)
+    
+    def _record_boot(self, line: str):
+        started, profile, cds = self._booting
+        self._booting = None
+        seconds = time.perf_counter() - started
+        server_seconds = float(m.group(1)) if (m := re.search(r"Done \(([\d.]+)s\)!", line)) is not None else None
+        
+        self.boot_log.record(profile, seconds, server_seconds, cds)
+        metrics.observe("mscr_server_boot_seconds", seconds, HookStats.SLOW_BUCKETS, profile=profile, server=self.name)
+        logging.info(f"server booted in {seconds:.2f}s (profile {profile}{f", cds {cds}" if cds else ""}).")
     
     def stop(self):
         self._check_running()
@@ -269,15 +705,24 @@ class MinecraftServer:
         self._spopen = None
     
     def _outputlogs(self):
-        while self._spopen.poll() is None:
+        # stop() 会把 self._spopen 置空, 这里持有本次启动的进程
+        spopen = self._spopen
+        while spopen.poll() is None:
             try:
-                rawline = self._spopen.stdout.readline().decode().strip("\n").strip("\r")
+                rawline = spopen.stdout.readline().decode().strip("\n").strip("\r")
+                start = time.perf_counter()
+                metrics.inc("mscr_log_lines_total", server=self.name)
+                
                 for lwp in self.log_waiter_promises.copy():
                     if lwp.pattern(rawline):
                         lwp.resolve(rawline)
                         self.log_waiter_promises.remove(lwp)
-                    
+                
+                if self._booting is not None and "]: Done (" in rawline: self._record_boot(rawline)
+                self.roster.observe(rawline)
+                self.health.observe(rawline)
                 line = self.loghooker(rawline)
+                metrics.observe("mscr_log_dispatch_seconds", time.perf_counter() - start, server=self.name)
                 if line: print(line)
             except Exception as e:
                 logging.error(f"error in outputlogs: {repr(e)}")
@@ -306,10 +751,21 @@ class MinecraftServer:
         reqid = randint(0, 2147483647)
         packet = self._make_rconpocket(reqid, packet_type, packet_body)
         pm = Promise(reqid)
-        rcon_promises.append(pm)
-        self._rcon.send(packet)
+        self.rcon_promises[reqid] = pm
+        if packet_type == RCON_PACKET_TYPE.SERVERDATA_AUTH: self._rcon_auth_rid = reqid
+        with self._rcon_lock:
+            self._rcon.sendall(packet)
         return pm
 
+    def _recv_exact(self, size: int):
+        # recv 可能只返回部分数据, 回复被分片时需要循环读满
+        data = b""
+        while len(data) < size:
+            chunk = self._rcon.recv(size - len(data))
+            if not chunk: raise ConnectionAbortedError("rcon connection closed")
+            data += chunk
+        return data
+    
     def _receive_rcon(self):
         while True:
             if self._rcon is None:
@@ -317,18 +773,20 @@ class MinecraftServer:
                 continue
             
             try:
-                packet_size = int.from_bytes(self._rcon.recv(4), "little")
-                packet = self._rcon.recv(packet_size)
+                packet_size = int.from_bytes(self._recv_exact(4), "little")
+                packet = self._recv_exact(packet_size)
                 
-                reqid = int.from_bytes(packet[:4], "little")
+                reqid = int.from_bytes(packet[:4], "little", signed=True)
                 packet_type = int.from_bytes(packet[4:8], "little")
                 packet_body = packet[8:-2].decode()
-                for pm in rcon_promises:
-                    if pm.rid == reqid:
-                        pm.resolve((reqid, packet_type, packet_body))
-                        rcon_promises.remove(pm)
-                        break
+                
+                # 认证失败时回复的请求 id 为 -1
+                if (pm := self.rcon_promises.pop(self._rcon_auth_rid if reqid == -1 else reqid, None)) is not None:
+                    metrics.observe("mscr_rcon_roundtrip_seconds", time.perf_counter() - pm.created, server=self.name)
+                    if pm.traced: tracer.complete("rcon:reply", pm.created, time.perf_counter(), rid=reqid, server=self.name)
+                    pm.resolve((reqid, packet_type, packet_body))
             except Exception as e:
+                if self._rcon is None: return
                 logging.error(f"error in rcon receive: {repr(e)}")
                 
                 if isinstance(e, ConnectionAbortedError):
@@ -363,11 +821,13 @@ class MinecraftServer:
         if not command: return
         command = command if command[0] != "/" else command[1:]
         
-        if urcon:
-            return self._send_rcon(RCON_PACKET_TYPE.SERVERDATA_EXECCOMMAND, command)
-        else:
-            self._spopen.stdin.write((f"{command}\n").encode())
-            self._spopen.stdin.flush()
+        metrics.inc("mscr_commands_sent_total", channel="rcon" if urcon else "stdin", server=self.name)
+        with tracer.span("send:rcon" if urcon else "send:stdin", "io", commands=1):
+            if urcon:
+                return self._send_rcon(RCON_PACKET_TYPE.SERVERDATA_EXECCOMMAND, command)
+            else:
+                self._spopen.stdin.write((f"{command}\n").encode())
+                self._spopen.stdin.flush()
     
     def run_commands(self, commands: list[str], adwl: bool = False, urcon: bool = False):
         if adwl:
@@ -376,32 +836,63 @@ class MinecraftServer:
             
         self._check_running()
         if not commands: return
-        command_joined = "\n".join([rldc for c in commands if (rldc := (c if c and c[0] != "/" else c[1:]))])
+        commands = [rldc for c in commands if (rldc := (c if c and c[0] != "/" else c[1:]))]
+        metrics.inc("mscr_commands_sent_total", len(commands), channel="rcon" if urcon else "stdin", server=self.name)
         
-        if urcon:
-            return self._send_rcon(RCON_PACKET_TYPE.SERVERDATA_EXECCOMMAND, command_joined)
-        else:
-            self._spopen.stdin.write(command_joined.encode() + b"\n")
-            self._spopen.stdin.flush()
+        with tracer.span("send:rcon" if urcon else "send:stdin", "io", commands=len(commands)):
+            if urcon:
+                # 服务器把一个 RCON 包的内容当作一条命令, 只能逐条发送; 同一连接上按顺序回复, 返回最后一条的 Promise
+                pm = None
+                for command in commands:
+                    pm = self._send_rcon(RCON_PACKET_TYPE.SERVERDATA_EXECCOMMAND, command)
+                return pm
+            else:
+                self._spopen.stdin.write("\n".join(commands).encode() + b"\n")
+                self._spopen.stdin.flush()
+    
+    def disconnect_rcon(self):
+        if self._rcon is None: return
+        rcon, self._rcon = self._rcon, None
+        rcon.close()
+    
+    def datapack_reload_commands(self):
+        metrics.inc("mscr_datapack_reloads_total", server=self.name)
+        return [
+            "datapack disable \"file/minecraftservercontrolerdatapack\"",
+            "datapack enable \"file/minecraftservercontrolerdatapack\""
+        ]
     
     def run_command_byfunc(self, command: str, urcon: bool = False):
         self.waiting_commands.clear()
+        start = time.perf_counter()
         rfid = randint(0, 2147483647)
-        with open(f"{self.datapack_funcspath}/{rfid}.mcfunction", "w", encoding="utf-8") as f:
-            f.write(command)
+        lines = command.count("\n") + 1
+        
+        with tracer.span("byfunc", "io", rfid=rfid, lines=lines, server=self.name):
+            traced = tracer.sampled()
+            with tracer.span("byfunc:write", "io", rfid=rfid):
+                with open(f"{self.datapack_funcspath}/{rfid}.mcfunction", "w", encoding="utf-8") as f:
+                    f.write(command)
+            metrics.inc("mscr_commands_sent_total", lines, channel="function", server=self.name)
             
-        pm = self.run_commands([
-            "datapack disable \"file/minecraftservercontrolerdatapack\"",
-            "datapack enable \"file/minecraftservercontrolerdatapack\"",
-            f"function minecraftservercontroler:{rfid}"
-        ], False, urcon)
+            # 等待日志的 Promise 必须在发送前注册, 否则服务器回复得足够快时会错过这一行
+            log_pm = None if urcon else LogWaiterPromise(self, lambda line: f"from function 'minecraftservercontroler:{rfid}'" in line)
+            with tracer.span("byfunc:send", "io", rfid=rfid):
+                pm = self.run_commands([
+                    *self.datapack_reload_commands(),
+                    f"function minecraftservercontroler:{rfid}"
+                ], False, urcon)
         
         if pm is None:
-            pm = LogWaiterPromise(self, lambda line: f"from function 'minecraftservercontroler:{rfid}'" in line)
+            pm = log_pm
             
         npm = Promise(-2)
         def waiter():
             npm.resolve(pm.wait())
+            end = time.perf_counter()
+            metrics.observe("mscr_byfunc_seconds", end - start, server=self.name)
+            # 从写入函数文件到服务器执行完毕的完整区间, 在等待线程上记录
+            if traced: tracer.complete("byfunc:wait", start, end, "io", rfid=rfid, server=self.name)
             self._remove_datapack_function(rfid)
         threading.Thread(target=waiter, daemon=True).start()
         
@@ -423,30 +914,959 @@ class MinecraftServer:
         return self.run_command(cstr, adwl, urcon)
     
     def get_players(self, urcon: bool = False):
-        pm = self.run_command("list", False, urcon)
+        # 由 roster 维护, 只在首次调用时发送 list; 需要强制刷新时先调用 self.roster.refresh()
+        return list(self.roster.snapshot(urcon))
+    
+class ConfigStore(dict):
+    # mscr_config.json 的内存副本: 修改后延迟合并写盘 (临时文件 + 替换), 并只通知订阅了被修改键的回调
+    
+    def __init__(self, path: str, defaults: dict[str, typing.Any]|None = None, delay: float = 1.0):
+        super().__init__(defaults or {})
+        self.path = path
+        self.delay = delay
+        self._subscribers: dict[str, list[typing.Callable[[str, typing.Any], typing.Any]]] = {}
+        self._timer: threading.Timer|None = None
+        self._lock = threading.RLock()
         
-        if pm is None:
-            pm = LogWaiterPromise(self, lambda line: f"There are" in line and f"players online: " in line)
+        if isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                super().update(json.load(f))
+    
+    def __setitem__(self, key: str, value: typing.Any):
+        changed = key not in self or self[key] != value
+        super().__setitem__(key, value)
+        if changed:
+            self.schedule_save()
+            self._notify([key])
+    
+    def __delitem__(self, key: str):
+        super().__delitem__(key)
+        self.schedule_save()
+        self._notify([key])
+    
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+    
+    def subscribe(self, keys: typing.Iterable[str], callback: typing.Callable[[str, typing.Any], typing.Any]):
+        with self._lock:
+            for key in keys:
+                self._subscribers.setdefault(key, []).append(callback)
+        return callback
+    
+    def callbacks(self):
+        with self._lock:
+            return {callback for callbacks in self._subscribers.values() for callback in callbacks}
+    
+    def unsubscribe(self, callback: typing.Callable[[str, typing.Any], typing.Any]):
+        with self._lock:
+            for callbacks in self._subscribers.values():
+                while callback in callbacks: callbacks.remove(callback)
+    
+    def _notify(self, keys: typing.Iterable[str]):
+        for key in keys:
+            with self._lock:
+                callbacks = self._subscribers.get(key, []).copy()
+            for callback in callbacks:
+                try: callback(key, self.get(key))
+                except Exception as e: logging.error(f"error in config subscriber for {key}: {repr(e)}")
+    
+    def schedule_save(self):
+        with self._lock:
+            if self._timer is not None: self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def flush(self):
+        with self._lock:
+            if self._timer is not None: self._timer.cancel()
+            self._timer = None
+            
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                f.write(json.dumps(self, indent=4))
+            replace(f"{self.path}.tmp", self.path)
+    
+    def refresh(self):
+        # 重新读取文件, 只通知值有变化或被删除的键 (删除的键回调收到 None), 返回这些键
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
         
-        return "".join(pm.wait().split("players online: ")[1:]).split(", ")
+        changed = [key for key, value in data.items() if key not in self or self[key] != value]
+        removed = list(self.keys() - data.keys())
+        for key in changed: super().__setitem__(key, data[key])
+        for key in removed: super().__delitem__(key)
+        self._notify(changed + removed)
+        return changed + removed
+
+class ConfigOverlay(dict):
+    # 单个服务器看到的配置: 服务器自己的覆盖项优先, 其余读共享的 ConfigStore
+    # 写入未覆盖的键, 订阅与写盘都转给共享配置, 回调收到的是本视图中的值
+    
+    def __init__(self, base: ConfigStore, overrides: dict[str, typing.Any]|None = None):
+        super().__init__(overrides or {})
+        self.base = base
+        self._wrapped: dict[typing.Callable, typing.Callable] = {}
+        self._keys: dict[typing.Callable, set[str]] = {}
+    
+    def __missing__(self, key: str):
+        return self.base[key]
+    
+    def __contains__(self, key: str):
+        return super().__contains__(key) or key in self.base
+    
+    def get(self, key: str, default: typing.Any = None):
+        return super().get(key, default) if super().__contains__(key) else self.base.get(key, default)
+    
+    def __setitem__(self, key: str, value: typing.Any):
+        if super().__contains__(key): super().__setitem__(key, value)
+        else: self.base[key] = value
+    
+    def subscribe(self, keys: typing.Iterable[str], callback: typing.Callable[[str, typing.Any], typing.Any]):
+        # 被覆盖的键在共享配置中变化时, 本视图的值不变, 不通知
+        if (wrapped := self._wrapped.get(callback)) is None:
+            wrapped = self._wrapped[callback] = lambda key, _: None if dict.__contains__(self, key) else callback(key, self.get(key))
+        keys = list(keys)
+        self._keys.setdefault(callback, set()).update(keys)
+        self.base.subscribe(keys, wrapped)
+        return callback
+    
+    def callbacks(self):
+        return self.base.callbacks()
+    
+    def unsubscribe(self, callback: typing.Callable[[str, typing.Any], typing.Any]):
+        # 既接受插件传入的原回调, 也接受 callbacks() 返回的包装后的回调
+        for original, wrapped in list(self._wrapped.items()):
+            if callback in (original, wrapped):
+                del self._wrapped[original]
+                self._keys.pop(original, None)
+                callback = wrapped
+        self.base.unsubscribe(callback)
+    
+    def flush(self):
+        self.base.flush()
+    
+    def set_overrides(self, overrides: dict[str, typing.Any]):
+        # 替换覆盖项并通知值有变化的键, 返回这些键; 只通知本视图的订阅者, 其他服务器的配置没有变化
+        changed = [key for key in {*dict.keys(self), *overrides} if dict.get(self, key) != overrides.get(key)]
+        super().clear()
+        super().update(overrides)
+        
+        for key in changed:
+            for callback in [c for c, keys in list(self._keys.items()) if key in keys]:
+                try: callback(key, self.get(key))
+                except Exception as e: logging.error(f"error in config subscriber for {key}: {repr(e)}")
+        return changed
+
+class AssetCache:
+    # 解码后资源 (图片像素, 网格) 的内存 LRU 缓存, 按 (类型, 路径, mtime, 大小, 变换参数) 区分
+    # disk_dir 不为 None 时, 解码后的图片另存为 .npy, 进程重启后也可跳过解码
+    
+    def __init__(self, max_bytes: int = 256 << 20, disk_dir: str|None = None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[tuple, tuple[typing.Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key_of(kind: str, path: str, *params: typing.Any):
+        st = stat(path)
+        return (kind, abspath(path), st.st_mtime_ns, st.st_size, *params)
+    
+    def get(self, key: tuple, loader: typing.Callable[[], typing.Any], sizeof: typing.Callable[[typing.Any], int]):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            self.misses += 1
+        
+        value = loader()
+        self.put(key, value, sizeof(value))
+        return value
     
+    def put(self, key: tuple, value: typing.Any, size: int):
+        if size > self.max_bytes: return
+        
+        with self._lock:
+            if key in self._items:
+                self.nbytes -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.nbytes += size
+            
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= self._items.popitem(last=False)[1][1]
+    
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+    
+    def configure(self, max_bytes: int, disk_dir: str|None = None):
+        # 重载配置时原地修改上限和磁盘目录, 保留已缓存的内容, 上限变小时淘汰最久未用的项
+        with self._lock:
+            self.max_bytes = max_bytes
+            self.disk_dir = disk_dir
+            
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= self._items.popitem(last=False)[1][1]
+    
+    def stats(self):
+        return {
+            "items": len(self._items),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+    
+    def _disk_path(self, key: tuple):
+        return f"{self.disk_dir}/{hashlib.sha256(repr(key).encode()).hexdigest()}.npy"
+    
+    def image(self, path: str, mode: str = "RGB", size: tuple[int, int]|None = None):
+        # 返回只读的 (H, W, C) uint8 像素数组, size 为 (宽, 高) 时先缩放
+        import numpy as np
+        
+        key = self.key_of("image", path, mode, size)
+        
+        def load():
+            disk_path = self._disk_path(key) if self.disk_dir is not None else None
+            if disk_path is not None and isfile(disk_path):
+                pixels = np.load(disk_path)
+            else:
+                from PIL import Image
+                
+                with Image.open(path) as im:
+                    im = im.convert(mode)
+                    if size is not None: im = im.resize(size)
+                    pixels = np.asarray(im)
+                
+                if disk_path is not None:
+                    makedirs(self.disk_dir, exist_ok=True)
+                    with open(f"{disk_path}.tmp", "wb") as f:
+                        np.save(f, pixels)
+                    replace(f"{disk_path}.tmp", disk_path)
+            
+            pixels.flags.writeable = False
+            return pixels
+        
+        return self.get(key, load, lambda pixels: pixels.nbytes)
+    
+    def mesh(self, path: str):
+        # 共享的网格对象, 调用方不应修改
+        key = self.key_of("mesh", path)
+        
+        def load():
+            import trimesh
+            return trimesh.load(path)
+        
+        def sizeof(mesh):
+            uv = getattr(getattr(mesh, "visual", None), "uv", None)
+            arrays = (getattr(mesh, "vertices", None), getattr(mesh, "faces", None), uv)
+            return sum(a.nbytes for a in arrays if a is not None)
+        
+        return self.get(key, load, sizeof)
+
+class HookStats:
+    # 单个钩子的调用次数, 总耗时, 最大耗时与按 BUCKETS (毫秒) 划分的耗时直方图
+    # 秒级的操作 (如服务器启动) 使用 SLOW_BUCKETS
+    
+    BUCKETS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, float("inf"))
+    SLOW_BUCKETS = (1000, 2000, 5000, 10000, 20000, 30000, 60000, 120000, 300000, float("inf"))
+    
+    def __init__(self, buckets: tuple[float, ...]|None = None):
+        self.buckets = buckets or self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * len(self.buckets)
+    
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max: self.max = seconds
+        self.histogram[bisect_left(self.buckets, seconds * 1000)] += 1
+    
+    def percentile(self, p: float):
+        # 直方图的近似分位数, 返回所在桶的上界 (毫秒)
+        rank = p * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.histogram):
+            seen += n
+            if seen >= rank: return bound
+        return self.buckets[-1]
+
+class HookProfiler:
+    # 按插件钩子, 命令回调与工作线程等待时间统计耗时; 同步钩子超过 warn_ms 时输出警告 (每个钩子每 10 秒最多一次)
+    # record 会在日志线程, 命令线程和工作线程中同时调用, 统计的读写都在 _lock 内进行
+    
+    def __init__(self, warn_ms: float = 50.0, enabled: bool = True):
+        self.warn_ms = warn_ms
+        self.enabled = enabled
+        self.stats: dict[str, HookStats] = {}
+        self._warned: dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, key: str, seconds: float, sync: bool = False):
+        if not self.enabled: return
+        
+        warn = False
+        with self._lock:
+            if (stats := self.stats.get(key)) is None:
+                stats = self.stats[key] = HookStats()
+            stats.add(seconds)
+            
+            if sync and seconds * 1000 > self.warn_ms:
+                now = time.time()
+                if now - self._warned.get(key, 0.0) > 10:
+                    self._warned[key] = now
+                    warn = True
+        
+        if warn: logging.warning(f"slow hook {key}: {seconds * 1000:.1f}ms (budget {self.warn_ms:.0f}ms)")
+    
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+            self._warned = {}
+    
+    def report(self):
+        with self._lock:
+            rows = [
+                (key, stats.count, stats.total, stats.percentile(0.5), stats.percentile(0.99), stats.max)
+                for key, stats in self.stats.items()
+            ]
+        
+        lines = [f"{"hook":<40} {"calls":>8} {"avg ms":>9} {"p50":>7} {"p99":>7} {"max ms":>9} {"total s":>9}"]
+        for key, count, total, p50, p99, max_seconds in sorted(rows, key=lambda row: -row[2]):
+            lines.append(
+                f"{key:<40} {count:>8} {total / count * 1000:>9.3f} "
+                f"{p50:>7g} {p99:>7g} {max_seconds * 1000:>9.3f} {total:>9.3f}"
+            )
+        return "\n".join(lines)
+
+class Metrics:
+    # 控制器运行时计数器, 可在控制台查看, 也可通过 HTTP 以 Prometheus 文本格式导出
+    # counter 与 histogram 可带标签, gauge 在导出时调用回调取值
+    
+    def __init__(self):
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._histograms: dict[tuple[str, tuple], HookStats] = {}
+        self._gauges: dict[tuple[str, tuple], typing.Callable[[], float]] = {}
+        self._lock = threading.Lock()
+        self._last_summary: tuple[float, dict[tuple[str, tuple], float]] = (time.time(), {})
+        self._httpd: ThreadingHTTPServer|None = None
+    
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def observe(self, name: str, seconds: float, buckets: tuple[float, ...]|None = None, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if (stats := self._histograms.get(key)) is None:
+                stats = self._histograms[key] = HookStats(buckets)
+            stats.add(seconds)
+    
+    def gauge(self, name: str, func: typing.Callable[[], float], **labels: str):
+        self._gauges[(name, tuple(sorted(labels.items())))] = func
+    
+    @staticmethod
+    def _labels(labels: tuple, extra: tuple = ()):
+        labels = (*labels, *extra)
+        if not labels: return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+    
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{self._labels(labels)} {value:g}")
+        
+        for (name, labels), func in sorted(self._gauges.items()):
+            try: value = func()
+            except Exception: continue
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name}{self._labels(labels)} {value:g}")
+        
+        for (name, labels), stats in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, n in zip(stats.buckets, stats.histogram):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound / 1000:g}"
+                lines.append(f"{name}_bucket{self._labels(labels, (("le", le), ))} {cumulative}")
+            lines.append(f"{name}_sum{self._labels(labels)} {stats.total:g}")
+            lines.append(f"{name}_count{self._labels(labels)} {stats.count}")
+        
+        return "\n".join(lines) + "\n"
+    
+    def summary(self):
+        # 控制台用的摘要, 计数器同时给出距上次查看以来的每秒速率
+        now = time.time()
+        last_time, last_counters = self._last_summary
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+        self._last_summary = (now, counters)
+        
+        lines = []
+        for (name, labels), value in sorted(counters.items()):
+            rate = (value - last_counters.get((name, labels), 0)) / max(now - last_time, 1e-9)
+            lines.append(f"{name}{self._labels(labels)} = {value:g} ({rate:.1f}/s)")
+        for (name, labels), func in sorted(self._gauges.items()):
+            try: lines.append(f"{name}{self._labels(labels)} = {func():g}")
+            except Exception: pass
+        for (name, labels), stats in sorted(histograms.items()):
+            lines.append(
+                f"{name}{self._labels(labels)}: n={stats.count} avg={stats.total / stats.count * 1000:.2f}ms "
+                f"p50<={stats.percentile(0.5):g}ms p99<={stats.percentile(0.99):g}ms max={stats.max * 1000:.2f}ms"
+            )
+        return "\n".join(lines)
+    
+    def serve(self, host: str = "127.0.0.1", port: int = 9464):
+        metrics = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args): ...
+        
+        self.shutdown()
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+    
+    def shutdown(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+metrics = Metrics()
+profiler = HookProfiler()
+
+class _Span:
+    __slots__ = ("tracer", "name", "cat", "args", "root", "sampled", "start")
+    
+    def __init__(self, tracer: Tracer, name: str, cat: str, args: dict, root: bool, sampled: bool):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.root = root
+        self.sampled = sampled
+    
+    def __enter__(self):
+        if self.root: self.tracer._local.sampled = self.sampled
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        if self.sampled: self.tracer._emit(self.name, self.cat, self.start, time.perf_counter(), self.args)
+        if self.root: self.tracer._local.sampled = None
+    
+    def set(self, **args: typing.Any):
+        self.args.update(args)
+
+class _NullSpan:
+    def __enter__(self): return self
+    def __exit__(self, *exc): ...
+    def set(self, **args: typing.Any): ...
+
+_NULL_SPAN = _NullSpan()
+
+class Tracer:
+    # 可选的命令生命周期追踪, 导出为 Chrome / Perfetto 可读的 trace JSON
+    # 每个线程最外层的 span 按 sample_rate 抽样, 内层 span 跟随外层的决定; sample_rate 为 0 时不记录
+    
+    def __init__(self, sample_rate: float = 0.0, capacity: int = 200000):
+        self.sample_rate = sample_rate
+        self.events: deque[dict] = deque(maxlen=capacity)
+        self._local = threading.local()
+        self._threads: dict[int, str] = {}
+        self._epoch = time.perf_counter()
+    
+    def span(self, name: str, cat: str = "mscr", **args: typing.Any):
+        if self.sample_rate <= 0: return _NULL_SPAN
+        
+        sampled = getattr(self._local, "sampled", None)
+        if sampled is None:
+            return _Span(self, name, cat, args, True, random() < self.sample_rate)
+        return _Span(self, name, cat, args, False, sampled)
+    
+    def sampled(self):
+        # 当前线程是否处于被抽中的 span 中, 用于跨线程的区间 (如 RCON 回复) 沿用发送时的决定
+        return bool(getattr(self._local, "sampled", None))
+    
+    def complete(self, name: str, start: float, end: float, cat: str = "mscr", **args: typing.Any):
+        self._emit(name, cat, start, end, args)
+    
+    def _emit(self, name: str, cat: str, start: float, end: float, args: dict):
+        tid = threading.get_ident()
+        if tid not in self._threads: self._threads[tid] = threading.current_thread().name
+        self.events.append({
+            "name": name, "cat": cat, "ph": "X", "pid": getpid(), "tid": tid,
+            "ts": (start - self._epoch) * 1e6, "dur": (end - start) * 1e6, "args": args
+        })
+    
+    def clear(self):
+        self.events.clear()
+    
+    def export(self, path: str):
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": getpid(), "tid": tid, "args": {"name": name}}
+            for tid, name in self._threads.items()
+        ]
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + list(self.events), "displayTimeUnit": "ms"}, f)
+        replace(f"{path}.tmp", path)
+        return len(self.events)
+
+tracer = Tracer()
+
+class SharedArray:
+    # 通过共享内存在控制器与工作进程之间传递的 numpy 数组, 序列化时只带名字, 形状和类型
+    # text 为 True 时内容是 UTF-8 编码的字符串 (如编码好的帧), 取回时还原为 str
+    
+    def __init__(self, array, text: bool = False):
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+        self.text = text
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self.name = self._shm.name
+        self.array()[...] = array
+    
+    def __getstate__(self):
+        return (self.name, self.shape, self.dtype, self.text)
+    
+    def __setstate__(self, state):
+        self.name, self.shape, self.dtype, self.text = state
+        self._shm = shared_memory.SharedMemory(name=self.name)
+    
+    def array(self):
+        import numpy as np
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+    
+    def value(self):
+        # 复制出不依赖共享内存的对象, 之后可以 release
+        return bytes(self.array()).decode() if self.text else self.array().copy()
+    
+    def disown(self):
+        # 交给另一个进程负责删除: 从本进程的 resource_tracker 中注销, 避免退出时被重复清理
+        resource_tracker.unregister(self._shm._name, "shared_memory")
+    
+    def close(self):
+        self._shm.close()
+    
+    def release(self):
+        self._shm.close()
+        self._shm.unlink()
+
+def _share(value: typing.Any, threshold: int, shared: list[SharedArray]):
+    # 把 value 中 (包括元组, 列表与字典里) 较大的 numpy 数组和字符串换成 SharedArray
+    if isinstance(value, (tuple, list)):
+        return type(value)(_share(v, threshold, shared) for v in value)
+    if isinstance(value, dict):
+        return {k: _share(v, threshold, shared) for k, v in value.items()}
+    
+    if isinstance(value, str) and len(value) >= threshold:
+        import numpy as np
+        shared.append(SharedArray(np.frombuffer(value.encode(), dtype=np.uint8), text=True))
+        return shared[-1]
+    if type(value).__module__ == "numpy" and type(value).__name__ == "ndarray" and value.nbytes >= threshold:
+        shared.append(SharedArray(value))
+        return shared[-1]
+    return value
+
+def _attach(value: typing.Any, shared: list[SharedArray]):
+    # 工作进程中把参数里的 SharedArray 换回数组视图 (不复制) 或字符串
+    if isinstance(value, SharedArray):
+        shared.append(value)
+        return value.value() if value.text else value.array()
+    if isinstance(value, (tuple, list)):
+        return type(value)(_attach(v, shared) for v in value)
+    if isinstance(value, dict):
+        return {k: _attach(v, shared) for k, v in value.items()}
+    return value
+
+def _unshare(value: typing.Any, shared: list[SharedArray]):
+    if isinstance(value, SharedArray):
+        shared.append(value)
+        return value.value()
+    if isinstance(value, (tuple, list)):
+        return type(value)(_unshare(v, shared) for v in value)
+    if isinstance(value, dict):
+        return {k: _unshare(v, shared) for k, v in value.items()}
+    return value
+
+class JobBridge:
+    # 后台任务与控制器之间的双向通道: 任务通过 run_commands 把命令交给控制器发送, 控制器通过 post 向任务发送事件
+    # 隔离插件的任务中两个队列是 multiprocessing.Manager 的队列, 其余情况是普通的 queue.Queue
+    
+    STOP = "stop"
+    
+    def __init__(self, commands, events):
+        self._commands = commands
+        self._events = events
+        self._stopped = False
+    
+    def run_command(self, command: str):
+        self._commands.put([command])
+    
+    def run_commands(self, commands: list[str]):
+        if commands: self._commands.put(list(commands))
+    
+    def event(self, timeout: float|None = None):
+        # 取下一个事件, 超时返回 None
+        try: event = self._events.get(timeout=timeout) if timeout != 0 else self._events.get_nowait()
+        except queue.Empty: return None
+        if event == self.STOP: self._stopped = True
+        return event
+    
+    def stopped(self):
+        # 处理完已收到的事件后, 是否收到了停止事件
+        while not self._stopped and self.event(0) is not None: ...
+        return self._stopped
+
+class WorkerJob:
+    # PluginWorkers.start 返回的任务: 任务提交的命令由后台线程发往 server, future 在命令全部发出后完成
+    
+    def __init__(self, server: MinecraftServer, bridge: JobBridge, name: str):
+        self.server = server
+        self.bridge = bridge
+        self.name = name
+        self.future = Future()
+    
+    def post(self, event: typing.Any):
+        self.bridge._events.put(event)
+    
+    def stop(self):
+        self.post(JobBridge.STOP)
+    
+    def result(self, timeout: float|None = None):
+        return self.future.result(timeout)
+    
+    def _pump(self, inner: Future):
+        # 转发命令直到任务结束且队列已空
+        while True:
+            try: commands = self.bridge._commands.get(timeout=0.1)
+            except queue.Empty:
+                if inner.done(): break
+                continue
+            except (EOFError, OSError):
+                break
+            
+            try: self.server.run_commands(commands)
+            except Exception as e: logging.error(f"error in sending commands of {self.name}: {repr(e)}")
+        
+        try: self.future.set_result(inner.result())
+        except Exception as e: self.future.set_exception(e)
+
+_worker_modules: dict[str, typing.Any] = {}
+
+def _isolated_call(path: str, name: str, args: tuple, kwargs: dict, threshold: int, bridge: JobBridge|None = None):
+    # 在工作进程中执行插件模块的函数; 插件模块按路径导入一次, 不执行 init
+    # 较大的结果放入共享内存, 由控制器复制后释放
+    if (module := _worker_modules.get(path)) is None:
+        spec = importlib.util.spec_from_file_location(f"mscr_worker_{len(_worker_modules)}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _worker_modules[path] = module
+    
+    shared: list[SharedArray] = []
+    results: list[SharedArray] = []
+    try:
+        func = getattr(module, name)
+        args = _attach(args, shared)
+        kwargs = _attach(kwargs, shared)
+        result = func(*args, **kwargs) if bridge is None else func(bridge, *args, **kwargs)
+        # 结果可能引用参数的共享内存, 在关闭之前放入新的共享内存或序列化
+        data = pickle.dumps(_share(result, threshold, results) if SHARE_RESULTS else result, protocol=pickle.HIGHEST_PROTOCOL)
+        for a in results: a.disown()
+        return data
+    except BaseException:
+        for a in results: a.release()
+        raise
+    finally:
+        for a in shared: a.close()
+        # 只关闭本进程的句柄, 共享内存由控制器取出结果后删除
+        for a in results: a.close()
+
+# Windows 上共享内存在最后一个句柄关闭时释放, 工作进程无法先于控制器关闭, 结果改为序列化传回
+SHARE_RESULTS = os_name != "nt"
+
+class PluginWorkers:
+    # 可选的插件进程隔离: isolated_plugins 中的插件通过 run() 把重计算放到进程池, 不占用控制器的 GIL
+    # 较大的 numpy 参数与结果 (数组, 长字符串) 经共享内存传递; 未隔离的插件直接在当前线程执行
+    # start() 启动可与控制器交互的后台任务: 任务函数的第一个参数是 JobBridge, 可以边计算边提交命令, 并接收事件
+    # 工作进程按路径导入插件模块但不调用 init, 因此参数和返回值不能是插件中定义的类的实例
+    
+    SHARED_THRESHOLD = 64 << 10
+    
+    def __init__(self, isolated: typing.Iterable[str] = (), max_workers: int|None = None, profiler: HookProfiler|None = None):
+        self.isolated = {abspath(path) for path in isolated}
+        self.max_workers = max_workers
+        self.profiler = profiler
+        self._pool: ProcessPoolExecutor|None = None
+        self._manager = None
+        self._lock = threading.Lock()
+    
+    def is_isolated(self, path: str):
+        return abspath(path) in self.isolated
+    
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.max_workers)
+            return self._pool
+    
+    def _get_manager(self):
+        # 进程池中的任务只能通过 Manager 的队列代理与控制器通信, 首次使用时启动
+        with self._lock:
+            if self._manager is None:
+                self._manager = Manager()
+            return self._manager
+    
+    def _submit(self, func: typing.Callable, args: tuple, kwargs: dict, bridge: JobBridge|None = None) -> Future:
+        path = func.__code__.co_filename
+        
+        if not self.is_isolated(path):
+            future = Future()
+            try: future.set_result(func(*args, **kwargs))
+            except Exception as e: future.set_exception(e)
+            return future
+        
+        shared: list[SharedArray] = []
+        submitted = time.perf_counter()
+        inner = self._get_pool().submit(
+            _isolated_call, abspath(path), func.__qualname__,
+            _share(args, self.SHARED_THRESHOLD, shared), {k: _share(v, self.SHARED_THRESHOLD, shared) for k, v in kwargs.items()},
+            self.SHARED_THRESHOLD, bridge
+        )
+        
+        future = Future()
+        def done(inner: Future):
+            if self.profiler is not None:
+                self.profiler.record(f"worker:{func.__qualname__}", time.perf_counter() - submitted)
+            for a in shared: a.release()
+            
+            results: list[SharedArray] = []
+            try:
+                future.set_result(_unshare(pickle.loads(inner.result()), results))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                for a in results: a.release()
+        inner.add_done_callback(done)
+        return future
+    
+    def run(self, func: typing.Callable, *args, **kwargs) -> Future:
+        return self._submit(func, args, kwargs)
+    
+    def start(self, server: MinecraftServer, func: typing.Callable, *args, **kwargs) -> WorkerJob:
+        # 在后台执行 func(bridge, *args, **kwargs); 未隔离的插件在新线程中执行
+        if self.is_isolated(func.__code__.co_filename):
+            manager = self._get_manager()
+            bridge = JobBridge(manager.Queue(), manager.Queue())
+        else:
+            bridge = JobBridge(queue.Queue(), queue.Queue())
+        job = WorkerJob(server, bridge, func.__qualname__)
+        
+        if self.is_isolated(func.__code__.co_filename):
+            inner = self._submit(func, args, kwargs, bridge)
+        else:
+            # 任务与命令转发各占一个线程, 命令在任务运行期间就会发出
+            inner = Future()
+            def call():
+                try: inner.set_result(func(bridge, *args, **kwargs))
+                except Exception as e: inner.set_exception(e)
+            threading.Thread(target=call, daemon=True).start()
+        
+        threading.Thread(target=job._pump, args=(inner, ), daemon=True).start()
+        return job
+    
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None: self._pool.shutdown(wait=False, cancel_futures=True)
+            if self._manager is not None: self._manager.shutdown()
+            self._pool = None
+            self._manager = None
+
+class ObjectPacker:
+    def __init__(self, obj: typing.Any, server: MinecraftServer|None = None):
+        self.obj = obj
+        self.server = server
+
+def parse_shell(cmd: str):
+    return list(map(lambda x: x[1:-1] if x.startswith("\"") and x.endswith("\"") else x, shlex.split(cmd, posix=False)))
+
+class PluginCommand:
+    def __init__(
+        self,
+        startswith: str,
+        callback: typing.Callable[[MinecraftServer, str, list[str]], typing.Any],
+        allow_users: list[str]|None = None,
+        need_async: bool = False
+    ):
+        self.startswith = f"~!{startswith}"
+        self.callback = callback
+        self.allow_users = allow_users
+        self.need_async = need_async
+    
+    def loghooker(self, packer: ObjectPacker):
+        # 匹配在日志线程中同步完成, need_async 时只有回调在新线程中执行
+        rawmsg: str = packer.obj
+        if "<" not in rawmsg or ">" not in rawmsg: return
+        if self.startswith not in rawmsg: return
+        
+        sender = rawmsg.split("<")[1].split(">")[0]
+        if self.allow_users and sender not in self.allow_users: return
+        
+        try: tokens = parse_shell("".join(rawmsg.split("> ")[1:]))
+        except ValueError: return
+        if not tokens or tokens[0] != self.startswith: return
+        
+        if self.need_async:
+            threading.Thread(target=self._run, args=(packer.server, sender, tokens[1:], time.perf_counter()), daemon=True).start()
+        else:
+            self._run(packer.server, sender, tokens[1:])
+    
+    def _run(self, server: MinecraftServer, sender: str, args: list[str], queued: float|None = None):
+        start = time.perf_counter()
+        if queued is not None: profiler.record(f"queue:{self.startswith}", start - queued)
+        
+        try:
+            with tracer.span(f"command:{self.startswith}", "plugin", sender=sender, args=args):
+                if queued is not None and tracer.sampled():
+                    tracer.complete(f"queue:{self.startswith}", queued, start, "plugin")
+                self.callback(server, sender, args)
+        finally:
+            profiler.record(f"command:{self.startswith}", time.perf_counter() - start, sync=not self.need_async)
+
+class LazyPluginCommand(PluginCommand):
+    # 代替未加载插件的命令: 匹配到前缀时在后台加载插件, 再把这条消息交给插件真正的命令
+    # allow_users 与插件注册的命令一致, 无权限的玩家不会触发加载
+    def __init__(self, plugin: LoadedPlugin, startswith: str, allow_users: list[str]|None = None):
+        super().__init__(startswith, callback=None, allow_users=allow_users)
+        self.plugin = plugin
+    
+    def loghooker(self, packer: ObjectPacker):
+        rawmsg: str = packer.obj
+        if f"> {self.startswith}" not in rawmsg: return
+        
+        sender = rawmsg.split("<")[1].split(">")[0] if "<" in rawmsg else ""
+        if self.allow_users and sender not in self.allow_users: return
+        
+        try: tokens = parse_shell("".join(rawmsg.split("> ")[1:]))
+        except ValueError: return
+        if tokens and tokens[0] == self.startswith:
+            threading.Thread(target=self._dispatch, args=(packer, ), daemon=True).start()
+    
+    def _dispatch(self, packer: ObjectPacker):
+        try:
+            self.plugin.ensure_loaded()
+        except Exception as e:
+            logging.error(f"error in loading plugin {self.plugin.path}: {repr(e)}")
+            return
+        
+        for command in self.plugin.commands:
+            command.loghooker(packer)
+
+class LogDispatcher:
+    # 把服务器的每行日志交给已加载插件的 loghooker 与插件命令, 并记录各自耗时
+    # ServerContext 在此之上负责插件的加载与配置, 基准测试直接使用它测量真实的分发路径
+    def __init__(self, server: MinecraftServer|None = None, tag: str = ""):
+        self.server = server
+        self.tag = tag
+        self.loaded_plugins: list[LoadedPlugin] = []
+        self.plugin_commands: list[PluginCommand] = []
+    
+    def loghooker(self, logline: str):
+        logline_packer = ObjectPacker(logline, self.server)
+        for loaded in self.loaded_plugins.copy():
+            # 插件可能同时在其他线程中被卸载, 只读取一次 module
+            if (module := loaded.module) is None: continue
+            
+            start = time.perf_counter()
+            module.loghooker(logline_packer)
+            profiler.record(f"hook:{loaded.info["name"]}{self.tag}", time.perf_counter() - start, sync=True)
+        
+        start = time.perf_counter()
+        for command in self.plugin_commands.copy():
+            command.loghooker(logline_packer)
+        profiler.record(f"dispatch:commands{self.tag}", time.perf_counter() - start, sync=True)
+        return ""
+
+def color_matcher(colordata: dict[str, list[float]]):
+    # 按 RGB 距离选出颜色最接近的方块; 返回未编译的版本, JIT 编译由调用方在后台完成
+    keys = tuple(colordata.keys())
+    values = tuple(map(tuple, colordata.values()))
+    
+    def getBlock_ByColor(r: int, g: int, b: int) -> str:
+        avgs = [(r - v[0]) ** 2 + (g - v[1]) ** 2 + (b - v[2]) ** 2 for v in values]
+        return keys[avgs.index(min(avgs))]
+    return getBlock_ByColor
+
+def draw_image(
+    server: MinecraftServer, cache: AssetCache, getBlock_ByColor: typing.Callable[[int, int, int], str],
+    path: str, pos: tuple[int, int, int], step: tuple[int, int], max_size: tuple[int, int], urcon: bool = False
+):
+    # 图片按比例缩小到不超过 max_size, 每个像素一个方块; 命令只加入等待队列, 由调用方选择发送方式
+    x, y, z = pos
+    dx, dz = step
+    maxw, maxh = max_size
+    
+    height, width = cache.image(path).shape[:2]
+    size = (width, height)
+    if width > maxw: width, height = maxw, int(height / width * maxw)
+    if height > maxh: width, height = int(width / height * maxh), maxh
+    pixels = cache.image(path, size=None if (width, height) == size else (width, height)).tolist()
+    
+    for imx in range(width):
+        for imy in range(height):
+            server.setblock(
+                x + imx * dx, y, z + imy * dz,
+                getBlock_ByColor(*pixels[imy][imx]),
+                adwl = True,
+                urcon = urcon
+            )
+    return width * height
+
 if __name__ == "__main__":
     import fix_workpath as _
     
     import importlib
     import builtins
-    import functools
-    import shlex
-    
-    from PIL import Image
-    from numba import jit
+    import ast
+    from collections import ChainMap
     
     import standard_plugin
-    import midi_parse
     
-    plugins: list[standard_plugin] # type: ignore
     ibcd_data: dict[str, list[float, float, float]]
-    plugin_commands: list[PluginCommand] = []
     
     DEFAULT_CONFIG = {
         "server_path": None,
@@ -463,63 +1883,210 @@ if __name__ == "__main__":
         with open("mscr_config.json", "w", encoding="utf-8") as f:
             f.write(json.dumps(DEFAULT_CONFIG, indent=4))
     
-    class ObjectPacker:
-        def __init__(self, obj: typing.Any):
-            self.obj = obj
-
-    def parse_shell(cmd: str):
-        return list(map(lambda x: x[1:-1] if x.startswith("\"") and x.endswith("\"") else x, shlex.split(cmd, posix=False)))
-    
-    def load_module(path: str):
-        spec = importlib.util.spec_from_file_location(f"module_{randint(0, 2147483647)}", path)
+    def load_module(path: str, name: str|None = None):
+        spec = importlib.util.spec_from_file_location(name or f"module_{randint(0, 2147483647)}", path)
         module = importlib.util.module_from_spec(spec)
         spec.loader.exec_module(module)
         return module
     
+    class LoadedPlugin:
+        # 一个服务器上的一个插件实例及它在 init 中注册的命令与配置订阅, 卸载时只移除这些
+        def __init__(self, path: str, ctx: ServerContext):
+            self.path = path
+            self.ctx = ctx
+            self.module: standard_plugin|None = None # type: ignore
+            self.info: dict[str, str] = {}
+            self.mtime = 0
+            self.commands: list[PluginCommand] = []
+            self.subscriptions: set[typing.Callable[[str, typing.Any], typing.Any]] = set()
+            self._lock = threading.Lock()
+        
+        def load_lazy(self):
+            # 插件以 plugin_meta = {"lazy": True, "commands": [...]} 声明时, 先只登记命令前缀, 首次使用时再导入
+            # 命令有权限限制时以 "allow_users_key" 给出保存允许玩家列表的配置项
+            meta = read_plugin_meta(self.path)
+            if not (meta.get("lazy") and meta.get("commands") and self.ctx.config.get("plugin_lazy_load", True)):
+                return self.load()
+            
+            self.mtime = stat(self.path).st_mtime_ns
+            self.info = {"name": meta.get("name", self.path), "version": "not loaded", "description": ""}
+            allow_users = self.ctx.config.get(meta["allow_users_key"], []) if "allow_users_key" in meta else None
+            self.commands = [LazyPluginCommand(self, prefix, allow_users) for prefix in meta["commands"]]
+            self.ctx.plugin_commands.extend(self.commands)
+            print(f"deferred plugin: {self.path}{self.ctx.tag} (loads on {", ".join(meta["commands"])})\n")
+        
+        def ensure_loaded(self):
+            with self._lock:
+                if self.module is not None: return
+                self.unload()
+                self.load()
+                self.ctx.sync_plugins()
+        
+        def load(self):
+            self.mtime = stat(self.path).st_mtime_ns
+            commands_before = self.ctx.plugin_commands.copy()
+            subscriptions_before = config.callbacks()
+            
+            # 每个服务器各自导入一份插件模块, 插件看到的 server, config, plugin_commands 等都属于该服务器
+            name = "".join(c if c.isalnum() else "_" for c in f"{self.ctx.name}_{abspath(self.path)}")
+            try:
+                module = load_module(self.path, f"mscr_plugin_{name}")
+                self.info = module.init(lambda: self.ctx.gvars)
+            finally:
+                self.commands = [c for c in self.ctx.plugin_commands if c not in commands_before]
+                self.subscriptions = config.callbacks() - subscriptions_before
+            
+            self.module = module
+            
+            print("\n".join([
+                f"loaded plugin: {self.info["name"]}{self.ctx.tag}",
+                f"plugin version: {self.info["version"]}",
+                f"plugin description: {self.info["description"]}",
+                ""
+            ]))
+        
+        def unload(self):
+            if self.module is not None:
+                try: self.module.close()
+                except Exception as e: logging.error(f"error in closing plugin {self.path}: {repr(e)}")
+            
+            self.ctx.plugin_commands[:] = [c for c in self.ctx.plugin_commands if c not in self.commands]
+            for callback in self.subscriptions: self.ctx.config.unsubscribe(callback)
+            self.module = None
+            self.commands = []
+            self.subscriptions = set()
+        
+        def changed(self):
+            try: return stat(self.path).st_mtime_ns != self.mtime
+            except FileNotFoundError: return False
+    
+    def read_plugin_meta(path: str) -> dict[str, typing.Any]:
+        # 只解析语法树读取 plugin_meta, 不执行插件代码
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+        
+        for node in tree.body:
+            if isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == "plugin_meta" for t in node.targets):
+                return ast.literal_eval(node.value)
+        return {}
+    
+    def reload_plugin(loaded: LoadedPlugin):
+        # 只重载这一个插件实例, 其他插件与它们的内存状态不受影响
+        loaded.unload()
+        try:
+            loaded.load()
+        except Exception as e:
+            logging.error(f"error in loading plugin {loaded.path}{loaded.ctx.tag}: {repr(e)}")
+        loaded.ctx.sync_plugins()
+    
+    def find_plugins(key: str, contexts: typing.Iterable[ServerContext]):
+        return [
+            loaded
+            for ctx in contexts
+            for loaded in ctx.loaded_plugins
+            if key in (loaded.path, loaded.info.get("name")) or abspath(key) == abspath(loaded.path)
+        ]
+    
+    def load_launch_profile(config: ConfigOverlay):
+        name = config.get("launch_profile", "default")
+        profiles = config.get("launch_profiles", {})
+        if name not in profiles and name != "default":
+            logging.error(f"launch profile {name} not found, using default.")
+            name = "default"
+        
+        try:
+            return LaunchProfile.from_config(name, profiles.get(name, {}))
+        except (TypeError, ValueError) as e:
+            logging.error(f"invalid launch profile {name}: {e}, using default.")
+            return LaunchProfile()
+    
+    def watch_plugins():
+        while True:
+            time.sleep(float(config.get("plugin_watch_interval", 1.0)))
+            if not config.get("plugin_hot_reload", False): continue
+            
+            for ctx in list(server_contexts.values()):
+                for loaded in ctx.loaded_plugins.copy():
+                    if loaded.changed():
+                        logging.info(f"plugin {loaded.path}{ctx.tag} changed, reloading...")
+                        reload_plugin(loaded)
+    
+    def server_entries():
+        # 未配置 servers 时, 由 server_path 配置单个名为 default 的服务器
+        entries = config.get("servers", None) or [{"name": "default", "server_path": config.get("server_path", None)}]
+        
+        names, rundirs = set(), set()
+        for entry in entries:
+            if not entry.get("name", None):
+                raise ValueError(f"server entry {entry} has no name.")
+            if entry.get("server_path", None) is None:
+                raise ValueError(f"server_path of server {entry.get("name")} is not set.")
+            if entry.get("name", None) in names:
+                raise ValueError(f"duplicate server name {entry.get("name")}.")
+            
+            rundir = abspath(entry.get("server_rundir", None) or dirname(abspath(entry["server_path"])))
+            if rundir in rundirs:
+                raise ValueError(f"server {entry["name"]} shares its run directory with another server.")
+            names.add(entry["name"])
+            rundirs.add(rundir)
+        
+        if (default := config.get("default_server", None)) is not None and default not in names:
+            raise ValueError(f"default_server {default} is not in servers.")
+        return entries
+    
     def reload():
-        global config, server_path
+        global config
         global imblock_colordata_path
         global boot_commands
-        global plugins, enable_drawim
+        global enable_drawim
+        global asset_cache, plugin_workers
         
-        with open("mscr_config.json", "r", encoding="utf-8") as f:
-            config = DEFAULT_CONFIG.copy()
-            config.update(json.load(f))
+        if "config" not in globals():
+            config = ConfigStore("mscr_config.json", DEFAULT_CONFIG)
+            config.flush()
+        else:
+            config.refresh()
         
-        save_config()
+        cache_kwargs = dict(
+            max_bytes = int(config.get("asset_cache_max_mb", 256)) << 20,
+            disk_dir = config.get("asset_cache_dir", None)
+        )
+        if "asset_cache" in globals(): asset_cache.configure(**cache_kwargs)
+        else: asset_cache = AssetCache(**cache_kwargs)
         
-        server_path = config.get("server_path", None)
-        if server_path is None:
-            logging.fatal("server_path is not set.")
-            raise SystemExit
+        if "plugin_workers" in globals(): plugin_workers.shutdown()
+        tracer.sample_rate = float(config.get("trace_sample_rate", 0.0))
+        profiler.warn_ms = float(config.get("hook_warn_ms", 50))
+        profiler.enabled = bool(config.get("hook_profiler", True))
+        plugin_workers = PluginWorkers(config.get("isolated_plugins", []), config.get("plugin_worker_processes", None), profiler)
         
-        if "plugins" in globals():
-            for plugin in plugins: plugin.close()
-            plugin_commands.clear()
+        try:
+            entries = server_entries()
+        except ValueError as e:
+            logging.fatal(e)
+            raise SystemExit
         
         imblock_colordata_path = config.get("imblock_colordata_path", None)
-        plugin_paths = config.get("plugins", []).copy()
         boot_commands = config.get("boot_commands", []).copy()
-        plugins = []
     
         enable_drawim = imblock_colordata_path is not None
 
-        for plugin in plugin_paths:
-            plugin_mod: standard_plugin = load_module(plugin)
-            plugin_info = plugin_mod.init(lambda: globals())
-            plugins.append(plugin_mod)
-            print("\n".join([
-                f"loaded plugin: {plugin_info["name"]}",
-                f"plugin version: {plugin_info["version"]}",
-                f"plugin description: {plugin_info["description"]}",
-                ""
-            ]))
+        for entry in entries:
+            if (ctx := server_contexts.get(entry["name"])) is None:
+                ctx = server_contexts[entry["name"]] = ServerContext(entry)
+                servers[ctx.name] = ctx.server
+            else:
+                ctx.configure(entry)
+            ctx.load_plugins()
+        
+        for name in server_contexts.keys() - {entry["name"] for entry in entries}:
+            logging.warning(f"server {name} is no longer in config, use \"server-stop {name}\" to stop it.")
     
     def save_config():
-        with open("mscr_config.json", "w", encoding="utf-8") as f:
-            f.write(json.dumps(config, indent=4))
+        config.flush()
     
     def load_ibcd():
+        # 先使用未编译的版本, numba 的导入与 JIT 编译在后台完成后再替换
         global getBlock_ByColor, ibcd_data, ibcd_keys, ibcd_values
         
         if not enable_drawim: return
@@ -529,10 +2096,23 @@ if __name__ == "__main__":
             ibcd_keys = tuple(ibcd_data.keys())
             ibcd_values = tuple(map(tuple, tuple(ibcd_data.values())))
     
-        @jit
-        def getBlock_ByColor(r: int, g: int, b: int) -> str:
-            avgs = [(r - v[0]) ** 2 + (g - v[1]) ** 2 + (b - v[2]) ** 2 for v in ibcd_values]
-            return ibcd_keys[avgs.index(min(avgs))]
+        getBlock_ByColor = color_matcher(ibcd_data)
+        
+        threading.Thread(target=_jit_ibcd, args=(getBlock_ByColor, ), daemon=True).start()
+    
+    def _jit_ibcd(func: typing.Callable[[int, int, int], str]):
+        global getBlock_ByColor
+        
+        try:
+            from numba import jit
+            
+            compiled = jit(func)
+            compiled(0, 0, 0)
+        except Exception as e:
+            logging.warning(f"getBlock_ByColor jit failed, using python version: {repr(e)}")
+            return
+        
+        if getBlock_ByColor is func: getBlock_ByColor = compiled
     
     def save_ibcd():
         if not enable_drawim: return
@@ -542,93 +2122,244 @@ if __name__ == "__main__":
         
         load_ibcd()
     
-    def loghooker(logline: str):
-        logline_packer = ObjectPacker(logline)
-        for plugin in plugins:
-            plugin.loghooker(logline_packer)
-        for command in plugin_commands:
-            command.loghooker(logline_packer)
-        return ""
+    class ServerContext(LogDispatcher):
+        # 一个受控服务器: MinecraftServer 实例, 它的配置视图, 以及只属于它的插件实例, 插件命令与日志分发
+        # 工作进程池, 资源缓存, 指标与追踪由所有服务器共享
+        def __init__(self, entry: dict[str, typing.Any]):
+            self.name: str = entry["name"]
+            super().__init__(tag = "" if len(config.get("servers", None) or ()) <= 1 else f" [{self.name}]")
+            self.config = ConfigOverlay(config, entry.get("config", {}))
+            self.plugins: list[standard_plugin] = [] # type: ignore
+            self.server = MinecraftServer(
+                server_path = entry["server_path"],
+                server_rundir = entry.get("server_rundir", None),
+                loghooker = self.loghooker,
+                name = self.name
+            )
+            
+            # 插件通过 gvars 取到的是本服务器的对象, 其余名字仍实时读取主模块的全局变量
+            self.gvars = ChainMap({
+                "server": self.server,
+                "config": self.config,
+                "server_context": self,
+                "loaded_plugins": self.loaded_plugins,
+                "plugin_commands": self.plugin_commands,
+                "plugins": self.plugins,
+                "run_userinputcmd": lambda ctokens: run_userinputcmd(ctokens, self)
+            }, globals())
+            
+            self.config.subscribe([
+                "player_roster_reconcile_interval", "launch_profile", "launch_profiles",
+                "health_sample_interval", "health_history", "health_perf_command"
+            ], self._apply_config)
+            self._apply_config()
+        
+        def _apply_config(self, *_):
+            self.server.roster.reconcile_interval = float(self.config.get("player_roster_reconcile_interval", 60.0))
+            self.server.profile = load_launch_profile(self.config)
+            self.server.health.interval = float(self.config.get("health_sample_interval", 5.0))
+            self.server.health.perf_command = self.config.get("health_perf_command", None)
+            self.server.health.set_history(int(self.config.get("health_history", 720)))
+        
+        def configure(self, entry: dict[str, typing.Any]):
+            # 重载配置时更新覆盖项; 服务器路径与运行目录只在停止时生效
+            self.config.set_overrides(entry.get("config", {}))
+            if self.server._spopen is None:
+                self.server.server_path = entry["server_path"]
+                self.server.server_rundir = entry.get("server_rundir", None) or dirname(abspath(entry["server_path"]))
+                self.server.boot_log = BootLog(f"{self.server.server_rundir}/mscr_boot_times.json")
+        
+        def load_plugins(self):
+            for loaded in self.loaded_plugins: loaded.unload()
+            self.loaded_plugins.clear()
+            self.plugin_commands.clear()
+            
+            for plugin in self.config.get("plugins", []).copy():
+                loaded = LoadedPlugin(plugin, self)
+                loaded.load_lazy()
+                self.loaded_plugins.append(loaded)
+            self.sync_plugins()
+        
+        def sync_plugins(self):
+            self.plugins[:] = [p.module for p in self.loaded_plugins if p.module is not None]
+        
+    server_contexts: dict[str, ServerContext] = {}
+    # 供插件按名字把命令发往其他服务器: gvars["servers"]["lobby"].run_command(...)
+    servers: dict[str, MinecraftServer] = {}
     
     def input(*args, **kwargs):
         if input_waittexts: return input_waittexts.pop(0)
         return builtins.input(*args, **kwargs)
     
-    def tfunc(f: typing.Callable):
-        @functools.wraps(f)
-        def wrapper(*args, **kwargs):
-            threading.Thread(target=f, args=args, kwargs=kwargs, daemon=True).start()
-        return wrapper
+    MIDI_TICK_RATE = 20
     
-    def getplaysoundtype_bynote(note: int):
-        note = note if 30 <= note <= 102 else (30 if note < 30 else 102)
+    def _build_playsound_table():
         typemap = sorted([
             ("bass", 30, 2),
             ("guitar", 42, 1),
             ("pling", 54, 1),
             ("xylophone", 78, 5),
         ], reverse=True)
-        for name, start, num in typemap:
-            if start <= note <= start + 24:
-                return name, 2 ** ((-12 + note - start) / 12), num
+        table = []
+        for note in range(128):
+            note = note if 30 <= note <= 102 else (30 if note < 30 else 102)
+            for name, start, num in typemap:
+                if start <= note <= start + 24:
+                    table.append((name, 2 ** ((-12 + note - start) / 12), num))
+                    break
+        return tuple(table)
     
-    dev_f: typing.Callable[[dict[str, typing.Any]], typing.Any]
-    def reload_devhot():
-        global dev_f
-        dev_f = load_module("./_devhotload.py").f
+    PLAYSOUND_TABLE = _build_playsound_table()
     
-    class PluginCommand:
-        def __init__(
-            self,
-            startswith: str,
-            callback: typing.Callable[[MinecraftServer, str, list[str]], typing.Any],
-            allow_users: list[str]|None = None,
-            need_async: bool = False
-        ):
-            self.startswith = f"~!{startswith}"
-            self.callback = callback
-            self.allow_users = allow_users
+    def getplaysoundtype_bynote(note: int):
+        return PLAYSOUND_TABLE[min(max(note, 0), 127)]
+    
+    def compile_midi(path: str, tick_rate: int = MIDI_TICK_RATE):
+        import midi_parse
+        
+        with open(path, "rb") as f:
+            mid = midi_parse.MidiFile(f.read())
+        
+        ticks: dict[int, list[str]] = {}
+        for msg in mid.play():
+            if msg["type"] != "note_on" or msg["velocity"] == 0: continue
             
-            if need_async:
-                self.loghooker = tfunc(self.loghooker)
+            name, note, num = getplaysoundtype_bynote(msg["note"])
+            vol = msg["velocity"] / 127
+            command = f"execute at @e[tag=midi_player] run playsound minecraft:block.note_block.{name} block @a ~ ~ ~ {vol} {note} {vol}"
+            ticks.setdefault(round(msg["sec_time"] * tick_rate), []).extend([command] * num)
+        
+        return sorted(ticks.items()), mid.second_length
+    
+    def compile_midi_datapack(path: str):
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        
+        cache_path = f"./midi-cache/{digest}"
+        funcprefix = f"minecraftservercontroler:midi/{digest}"
         
-        def loghooker(self, packer: ObjectPacker):
-            rawmsg: str = packer.obj
-            if "<" not in rawmsg or ">" not in rawmsg: return
+        if not isdir(cache_path):
+            schedule, _ = compile_midi(path)
+            tmp_path = f"{cache_path}.tmp"
+            if isdir(tmp_path): shutil.rmtree(tmp_path)
+            makedirs(tmp_path)
             
-            sender = rawmsg.split("<")[1].split(">")[0]
-            if self.allow_users and sender not in self.allow_users: return
+            for i, (tick, commands) in enumerate(schedule):
+                if i + 1 < len(schedule):
+                    next_tick = schedule[i + 1][0]
+                    commands = [*commands, f"schedule function {funcprefix}/t{next_tick} {next_tick - tick}t"]
+                with open(f"{tmp_path}/t{tick}.mcfunction", "w", encoding="utf-8") as f:
+                    f.write("\n".join(commands))
             
-            tokens = parse_shell("".join(rawmsg.split("> ")[1:]))
-            if tokens[0] == self.startswith:
-                self.callback(server, sender, tokens[1:])
+            with open(f"{tmp_path}/start.mcfunction", "w", encoding="utf-8") as f:
+                if schedule:
+                    first_tick = schedule[0][0]
+                    f.write(f"function {funcprefix}/t0" if first_tick == 0 else f"schedule function {funcprefix}/t{first_tick} {first_tick}t")
+            
+            rename(tmp_path, cache_path)
+        
+        return cache_path, digest
+    
+    def play_midi_datapack(server: MinecraftServer, path: str):
+        cache_path, digest = compile_midi_datapack(path)
+        funcs_path = f"{server.datapack_funcspath}/midi/{digest}"
+        
+        commands = []
+        if not isdir(funcs_path):
+            shutil.copytree(cache_path, funcs_path)
+            commands.extend(server.datapack_reload_commands())
+        
+        commands.append(f"function minecraftservercontroler:midi/{digest}/start")
+        server.run_commands(commands, urcon=rcon_mode)
+    
+    def play_midi_schedule(server: MinecraftServer, schedule: list[tuple[int, list[str]]], second_length: float, tick_rate: int = MIDI_TICK_RATE):
+        start = time.perf_counter()
+        for tick, commands in schedule:
+            delay = start + tick / tick_rate - time.perf_counter()
+            if delay > 0: time.sleep(delay)
+            
+            server.run_commands(commands, urcon=rcon_mode)
+            print(f"\rnow time: {tick / tick_rate:.2f}s / {second_length:.2f}s", end="")
+        print()
+    
+    dev_f: typing.Callable[[dict[str, typing.Any]], typing.Any]
+    def reload_devhot():
+        global dev_f
+        dev_f = load_module("./_devhotload.py").f
     
     reload_devhot()
     reload()
     load_ibcd()
+    threading.Thread(target=watch_plugins, daemon=True).start()
     
     class DebugException(BaseException): ...
     caseException = (Exception, KeyboardInterrupt)
     
-    server = MinecraftServer(
-        server_path = server_path,
-        loghooker = loghooker
-    )
-    server.start()
+    if config.get("metrics_port", None) is not None:
+        metrics.serve(config.get("metrics_host", "127.0.0.1"), int(config["metrics_port"]))
+    for ctx in server_contexts.values():
+        if ctx.config.get("server_autostart", True): ctx.server.start()
     
+    # 没有用 @<name> 指定服务器时, 控制台命令发往 current_server
+    current_server = config.get("default_server", None) or next(iter(server_contexts))
     rcon_mode = False
-    heavy_taskrunner = server.run_adwl_byfunc
+    heavy_taskrunner = "run_adwl_byfunc"
     input_waittexts = []
     
-    def run_userinputcmd(ctokens: list[str]):
+    def run_userinputcmd(ctokens: list[str], ctx: ServerContext|None = None):
         global rcon_mode
         global heavy_taskrunner
+        global current_server
+        
+        if ctokens[0].startswith("@"):
+            if (target := server_contexts.get(ctokens[0][1:])) is None:
+                logging.error(f"server {ctokens[0][1:]} not found.")
+                return
+            return run_userinputcmd(ctokens[1:], target) if len(ctokens) > 1 else None
+        
+        targets = [ctx] if ctx is not None else list(server_contexts.values())
+        ctx = ctx or server_contexts[current_server]
+        server = ctx.server
         
         match ctokens[0]:
             case "stop" | "exit" | "quit":
-                server.stop()
+                for other in servers.values():
+                    if other._spopen is not None:
+                        other.disconnect_rcon()
+                        other.stop()
+                # 插件的 close 中可能还有未写出的数据
+                for other_ctx in server_contexts.values():
+                    for loaded in other_ctx.loaded_plugins: loaded.unload()
+                config.flush()
                 return "break"
             
+            case "servers":
+                for name, other in servers.items():
+                    running = other._spopen is not None and other._spopen.poll() is None
+                    mspt = other.health.value("mspt")
+                    print(
+                        f"{"*" if name == current_server else " "} {name}: {"running" if running else "stopped"}"
+                        f"{f", {len(other.roster._players)} players" if running else ""}"
+                        f"{f", {mspt:.1f} mspt" if mspt == mspt else ""}"
+                        f", {other.server_rundir}"
+                    )
+            
+            case "use":
+                if len(ctokens) < 2 or ctokens[1] not in server_contexts:
+                    logging.error("usage: use <server name>")
+                    return
+                current_server = ctokens[1]
+                logging.info(f"console commands now go to {current_server}.")
+            
+            case "server-start":
+                server.start()
+                logging.info(f"server {ctx.name} started.")
+            
+            case "server-stop":
+                server.disconnect_rcon()
+                server.stop()
+                logging.info(f"server {ctx.name} stopped.")
+            
             case "cmd" | "command":
                 result = server.run_command(" ".join(ctokens[1:]), urcon=rcon_mode)
                 if rcon_mode: logging.info(f"rcon result: {result.wait()}")
@@ -644,42 +2375,25 @@ if __name__ == "__main__":
                 maxw, maxh = map(lambda x: int(float(x)), input("maxw, maxh > ").split(" "))
                 logging.info("drawing...")
                 
-                im = Image.open(img_path).convert("RGB")
-                if im.width > maxw: im = im.resize((maxw, int(im.height / im.width * maxw)))
-                if im.height > maxh: im = im.resize((int(im.width / im.height * maxh), maxh))
-                
-                for imx in range(im.width):
-                    for imy in range(im.height):
-                        server.setblock(
-                            x + imx * dx, y, z + imy * dz,
-                            getBlock_ByColor(*im.getpixel((imx, imy))),
-                            adwl = True,
-                            urcon = rcon_mode
-                        )
-                        
-                heavy_taskrunner(rcon_mode)
+                draw_image(server, asset_cache, getBlock_ByColor, img_path, (x, y, z), (dx, dz), (maxw, maxh), rcon_mode)
+                getattr(server, heavy_taskrunner)(rcon_mode)
                 logging.info("drawim success.")
             
             case "play_midi":
                 print("tip: playsound is executed at @e[tag=midi_player]")
-                mid = midi_parse.MidiFile(open(" ".join(ctokens[1:]), "rb").read())
-                more_delta = 0.0
-                for msg in mid.play():
-                    dt = msg["global_sec_delta"] - more_delta
-                    time.sleep(max(dt, 0.0))
-                    t = time.perf_counter()
-                    print(f"\rnow time: {msg["sec_time"]:.2f}s / {mid.second_length:.2f}s", end="")
-                    
-                    match msg["type"]:
-                        case "note_on":
-                            name, note, num = getplaysoundtype_bynote(msg["note"])
-                            vol = msg["velocity"] / 127
-                            command = f"execute at @e[tag=midi_player] run playsound minecraft:block.note_block.{name} block @a ~ ~ ~ {vol} {note} {vol}"
-                            for _ in range(num): server.run_command(command, urcon=rcon_mode)
-                            
-                    more_delta = time.perf_counter() - t
-                    # if dt < 0.0:
-                    #     more_delta += -dt
+                
+                if ctokens[1:2] == ["--datapack"]:
+                    play_midi_datapack(server, " ".join(ctokens[2:]))
+                    logging.info("midi function started.")
+                else:
+                    play_midi_schedule(server, *compile_midi(" ".join(ctokens[1:])))
+            
+            case "asset-cache":
+                if ctokens[1:2] == ["clear"]:
+                    asset_cache.clear()
+                    logging.info("asset cache cleared.")
+                else:
+                    logging.info(f"asset cache: {asset_cache.stats()}")
             
             case "_devhot_reload":
                 reload_devhot()
@@ -688,6 +2402,56 @@ if __name__ == "__main__":
                 reload()
                 logging.info("reload success.")
             
+            case "reload-plugin":
+                # 不指定服务器时在所有加载了该插件的服务器上重载
+                if not (found := find_plugins(" ".join(ctokens[1:]), targets)):
+                    logging.error("plugin not found.")
+                    return
+                
+                for loaded in found:
+                    reload_plugin(loaded)
+                    logging.info(f"reload plugin {loaded.path}{loaded.ctx.tag} success.")
+            
+            case "trace":
+                match ctokens[1:2]:
+                    case ["start"]:
+                        tracer.sample_rate = float(ctokens[2]) if len(ctokens) > 2 else 1.0
+                        logging.info(f"tracing started, sample rate {tracer.sample_rate}.")
+                    case ["stop"]:
+                        tracer.sample_rate = 0.0
+                        logging.info("tracing stopped.")
+                    case ["dump"]:
+                        path = ctokens[2] if len(ctokens) > 2 else f"./trace-{time.time()}.json"
+                        logging.info(f"saved {tracer.export(path)} trace events to {path}")
+                    case ["clear"]:
+                        tracer.clear()
+                    case _:
+                        logging.info("usage: trace start [sample-rate] | stop | dump [path] | clear")
+            
+            case "metrics":
+                print(metrics.summary())
+            
+            case "launch-profile":
+                logging.info(f"launch profile {server.profile.name}: {" ".join(server.launch_command((), None))}")
+            
+            case "boot-times":
+                print(server.boot_log.report())
+            
+            case "health":
+                seconds = float(ctokens[1]) if len(ctokens) > 1 else 60.0
+                logging.info(f"latest: {server.health.latest()}")
+                logging.info(f"last {seconds:g}s: {server.health.summary(seconds)}")
+            
+            case "plugin-stats":
+                if ctokens[1:2] == ["reset"]:
+                    profiler.reset()
+                    logging.info("plugin stats reset.")
+                else:
+                    print(profiler.report())
+            
+            case "reload-config":
+                logging.info(f"config reloaded, changed keys: {config.refresh()}")
+            
             case "reload-ibcd":
                 if not enable_drawim:
                     logging.error("drawim is disabled.")
@@ -743,7 +2507,11 @@ if __name__ == "__main__":
                 for i, ri in enumerate(runners):
                     print(f"{i + 1}. {ri}")
                 
-                heavy_taskrunner = getattr(server, input("runner function name > "))
+                runner = input("runner function name > ")
+                if runner not in ("run_adwl", "run_adwl_byfunc"):
+                    logging.error("unknown runner.")
+                    return
+                heavy_taskrunner = runner
             
             case "py-exec":
                 exec(input("code > "))
@@ -761,7 +2529,7 @@ if __name__ == "__main__":
                 ctokens = cmd_item["ctokens"]
                 input_waittexts.extend(cmd_item["arguments"])
             else:
-                ctokens = parse_shell(input(">>> "))
+                ctokens = parse_shell(input(">>> " if len(servers) == 1 else f"{current_server} >>> "))
                 
             if not ctokens: continue
             res = run_userinputcmd(ctokens)